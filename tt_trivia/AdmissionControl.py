@@ -0,0 +1,128 @@
+import asyncio
+from collections import OrderedDict
+from typing import Hashable
+
+from GameClock import Clock, REAL_CLOCK
+from RateLimit import TokenBucket
+
+MAX_GAMES = 20
+# Every start fetches its questions from opentdb, which takes one request per IP every 5 seconds
+STARTS_PER_SECOND = 0.2
+START_BURST = 1
+MAX_QUEUED = 50
+# Smoothed event loop lag, in seconds, above which fewer games are admitted
+MAX_LOOP_LAG = 0.1
+LAG_SAMPLE_INTERVAL = 0.5
+LAG_WEIGHT = 0.2
+# Rate limit waits shorter than this are Discord's normal pacing of sends, not a sign of pressure
+RATE_LIMIT_PRESSURE = 2.0
+
+
+class QueueFull(RuntimeError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class AdmissionController:
+    """
+    Decides when new games may start. At most `max_games` games run at once and starts are paced by a token bucket;
+    starts over either limit wait in a first come first served queue, one entry per game. While the event loop is
+    lagging or Discord is rate limiting the bot, the concurrency limit is halved, then raised by one per healthy lag
+    sample until it is back to `max_games`. Games that are already running are never shed.
+    """
+    _running: set[Hashable]
+    _queue: OrderedDict[Hashable, asyncio.Future]
+
+    def __init__(self, clock: Clock = REAL_CLOCK, max_games: int = MAX_GAMES,
+                 starts_per_second: float = STARTS_PER_SECOND, burst: int = START_BURST,
+                 max_queued: int = MAX_QUEUED, max_lag: float = MAX_LOOP_LAG):
+        self._clock = clock
+        self._max_games = max_games
+        self._limit = max_games
+        self._starts = TokenBucket(starts_per_second, burst, clock.now())
+        self._max_queued = max_queued
+        self._max_lag = max_lag
+        self._running = set()
+        self._queue = OrderedDict()
+        self._lag = 0.0
+        self._pressure_until = 0.0
+        self._pump_task: asyncio.Task | None = None
+        self._rejected = 0
+
+    def request(self, key: Hashable) -> asyncio.Future:
+        """
+        Ask to start a game.
+        :return: a future which resolves once the game may start, or is cancelled if the game is released first
+        :raises QueueFull: if too many starts are already waiting
+        """
+        if key in self._queue:
+            return self._queue[key]
+        if len(self._queue) >= self._max_queued:
+            self._rejected += 1
+            raise QueueFull(f"{len(self._queue)} game starts are already queued")
+        future = asyncio.get_running_loop().create_future()
+        self._queue[key] = future
+        self._pump()
+        return future
+
+    def position(self, key: Hashable) -> int:
+        # 1 based position in the queue, 0 if not queued. The queue is short, a scan is fine
+        for i, queued in enumerate(self._queue, 1):
+            if queued == key:
+                return i
+        return 0
+
+    def release(self, key: Hashable):
+        # Call when a game ends, or is abandoned while queued
+        self._running.discard(key)
+        future = self._queue.pop(key, None)
+        if future is not None:
+            future.cancel()
+        self._pump()
+
+    def note_rate_limit(self, retry_after: float):
+        if retry_after >= RATE_LIMIT_PRESSURE:
+            self._pressure_until = max(self._pressure_until, self._clock.now() + retry_after)
+
+    def is_pressured(self) -> bool:
+        return self._lag > self._max_lag or self._clock.now() < self._pressure_until
+
+    def _pump(self):
+        # Admit queued games, in order, while there is room and start tokens to spare
+        now = self._clock.now()
+        while self._queue and len(self._running) < self._limit:
+            key, future = next(iter(self._queue.items()))
+            if future.done():
+                del self._queue[key]
+                continue
+            if not self._starts.try_take(now):
+                self._pump_later(self._starts.time_until(now))
+                return
+            del self._queue[key]
+            self._running.add(key)
+            future.set_result(None)
+
+    def _pump_later(self, delay: float):
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._delayed_pump(delay), name="ttt-admission-pump")
+
+    async def _delayed_pump(self, delay: float):
+        await self._clock.sleep(delay)
+        self._pump()
+
+    async def monitor(self, interval: float = LAG_SAMPLE_INTERVAL):
+        # Measures event loop lag as how late a sleep wakes up, and adjusts the concurrency limit to match
+        while True:
+            before = self._clock.now()
+            await self._clock.sleep(interval)
+            lag = max(0.0, self._clock.now() - before - interval)
+            self._lag += LAG_WEIGHT * (lag - self._lag)
+            if self.is_pressured():
+                self._limit = max(1, self._limit // 2)
+            elif self._limit < self._max_games:
+                self._limit += 1
+            self._pump()
+
+    def get_stats(self) -> dict[str, float]:
+        return {"running": len(self._running), "queued": len(self._queue), "limit": self._limit,
+                "loop_lag": self._lag, "rejected": self._rejected}
@@ -0,0 +1,195 @@
+import html
+import re
+import unicodedata
+
+ARTICLES = frozenset({"a", "an", "the"})
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90, "hundred": 100, "thousand": 1000, "million": 1000000,
+}
+# Verdict caches are cleared once they hold this many guesses, so spam can't grow them without bound
+MAX_CACHED_GUESSES = 4096
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+# Punctuation that carries meaning in an answer, like the "#" in "C#". Other punctuation is dropped harmlessly
+SIGNIFICANT_PUNCTUATION = frozenset("#%@")
+
+
+def normalize(text: str) -> str:
+    """
+    Reduce an answer or guess to a canonical form: html entities decoded, accents stripped, lower case, punctuation
+    removed, articles dropped and number words replaced with digits. eg. "The Beatl&eacute;s!" -> "beatles",
+    "Twenty-One Pilots" -> "21 pilots"
+    """
+    tokens = _NON_ALNUM.sub(" ", _fold(text)).split()
+    # Keep a lone article, eg. the answer "A"
+    if len(tokens) > 1:
+        tokens = [t for t in tokens if t not in ARTICLES] or tokens
+    return " ".join(_join_numbers(tokens))
+
+
+def _fold(text: str) -> str:
+    # html entities decoded, accents stripped and lower case
+    text = unicodedata.normalize("NFKD", html.unescape(text))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def exact_form(text: str) -> str:
+    # Comparison form for answers normalize() can't be trusted with: case folded, with whitespace collapsed
+    return " ".join(html.unescape(text).casefold().split())
+
+
+def loses_meaning(text: str, normalized: str) -> bool:
+    """
+    Whether normalizing an answer threw away characters that matter, so "C++" and "C#" can't both become "c", and an
+    answer made only of symbols or non-latin letters, like "+" or "Ω", doesn't become "" and impossible to match.
+    """
+    if not normalized:
+        return True
+    return any(unicodedata.category(c)[0] == "S" or c in SIGNIFICANT_PUNCTUATION for c in _fold(text))
+
+
+def _join_numbers(tokens: list[str]) -> list[str]:
+    # Replace each run of number words that reads as one number with its digits, eg. "one hundred and five" -> "105".
+    # Words that can't continue the number before them start a new one, so "one two" stays "1 2"
+    joined = []
+    total = current = None
+    for i, token in enumerate(tokens):
+        value = NUMBER_WORDS.get(token)
+        if value is None:
+            if token == "and" and current is not None and i + 1 < len(tokens) and tokens[i + 1] in NUMBER_WORDS:
+                continue
+            if current is not None:
+                joined.append(str(total + current))
+                total = current = None
+            joined.append(token)
+            continue
+        if current is not None and not _continues(total, current, value):
+            joined.append(str(total + current))
+            total = current = None
+        if current is None:
+            total, current = 0, 0
+            if value == 0:
+                joined.append("0")
+                total = current = None
+                continue
+        if value == 100:
+            current = (current or 1) * 100
+        elif value >= 1000:
+            total += (current or 1) * value
+            current = 0
+        else:
+            current += value
+    if current is not None:
+        joined.append(str(total + current))
+    return joined
+
+
+def _continues(total: int, current: int, value: int) -> bool:
+    # Whether a number word can follow the number read so far, as in "twenty one" or "two hundred thousand"
+    if value == 0:
+        return False
+    if value == 100:
+        return 0 < current < 100
+    if value >= 1000:
+        return total % (value * 1000) == 0 and current < 1000
+    tens_and_units = current % 100
+    return tens_and_units == 0 or (value < 10 and tens_and_units >= 20 and tens_and_units % 10 == 0)
+
+
+def edit_budget(normalized: str) -> int:
+    # How many typos an answer tolerates. Numbers and short answers have to be exact
+    if normalized.replace(" ", "").isdigit() or len(normalized) <= 3:
+        return 0
+    if len(normalized) <= 6:
+        return 1
+    if len(normalized) <= 12:
+        return 2
+    return 3
+
+
+def pattern_masks(pattern: str) -> dict[str, int]:
+    masks = {}
+    for i, c in enumerate(pattern):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def bounded_edit_distance(masks: dict[str, int], length: int, text: str, max_edits: int) -> int | None:
+    """
+    Levenshtein distance between a pattern and `text`, using Myers' bit-parallel algorithm (Hyyrö's formulation for
+    global distance), which handles a whole column of the DP table per character of text.
+    :param masks: pattern_masks() of the pattern
+    :param length: length of the pattern
+    :param text: the string to compare against the pattern
+    :param max_edits: give up once the distance is known to exceed this
+    :return: the distance, or None if it's more than max_edits
+    """
+    remaining = len(text)
+    if abs(remaining - length) > max_edits:
+        return None
+    if length == 0:
+        return remaining
+    all_ones = (1 << length) - 1
+    last = 1 << (length - 1)
+    pv, mv, score = all_ones, 0, length
+    for c in text:
+        eq = masks.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & all_ones)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        remaining -= 1
+        # Each remaining character can lower the score by at most one
+        if score - remaining > max_edits:
+            return None
+        ph = ((ph << 1) | 1) & all_ones
+        mh = (mh << 1) & all_ones
+        pv = mh | (~(xv | ph) & all_ones)
+        mv = ph & xv
+    return score if score <= max_edits else None
+
+
+class AnswerMatcher:
+    """
+    Fuzzy matcher for one free response answer. The answer's normalized form and bit masks are computed once, and
+    verdicts are cached per distinct guess, so a channel repeating the same guesses costs a dict lookup each.
+    """
+    __slots__ = ("answer", "normalized", "exact", "max_edits", "_masks", "_verdicts", "_normalized_verdicts")
+
+    def __init__(self, answer: str):
+        self.answer = answer
+        self.normalized = normalize(answer)
+        # Answers with symbols that matter are matched exactly, apart from case and spacing
+        self.exact = exact_form(answer) if loses_meaning(answer, self.normalized) else None
+        self.max_edits = edit_budget(self.normalized)
+        self._masks = pattern_masks(self.normalized)
+        # Raw guess -> verdict, and normalized guess -> verdict
+        self._verdicts: dict[str, bool] = {}
+        self._normalized_verdicts: dict[str, bool] = {}
+
+    def matches(self, guess: str) -> bool:
+        verdict = self._verdicts.get(guess)
+        if verdict is None:
+            if len(self._verdicts) >= MAX_CACHED_GUESSES:
+                self._verdicts.clear()
+            if self.exact is not None:
+                verdict = self._verdicts[guess] = exact_form(guess) == self.exact
+            else:
+                verdict = self._verdicts[guess] = self._match_normalized(normalize(guess))
+        return verdict
+
+    def _match_normalized(self, guess: str) -> bool:
+        verdict = self._normalized_verdicts.get(guess)
+        if verdict is None:
+            if len(self._normalized_verdicts) >= MAX_CACHED_GUESSES:
+                self._normalized_verdicts.clear()
+            verdict = guess != "" and (guess == self.normalized or bounded_edit_distance(
+                self._masks, len(self.normalized), guess, self.max_edits) is not None)
+            self._normalized_verdicts[guess] = verdict
+        return verdict
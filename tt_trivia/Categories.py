@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+import requests
+
+_RESOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resource")
+API_COUNT_URL = "https://opentdb.com/api_count.php?category="
+# Seconds between refreshes of the question counts
+REFRESH_INTERVAL = 6 * 60 * 60
+MAX_QUESTIONS = 50
+
+
+@dataclass(frozen=True)
+class CategoryCounts:
+    total: int
+    easy: int
+    medium: int
+    hard: int
+
+    def for_difficulty(self, difficulty: str) -> int:
+        return self.total if difficulty == "any" else getattr(self, difficulty)
+
+
+class CategoryRegistry:
+    """
+    Read only registry of the trivia categories, loaded once per process, along with how many questions opentdb has
+    for each category and difficulty. The counts are cached on disk and refreshed in the background, so start
+    commands can be checked without a round trip.
+
+    A registry made without ids loads them on first use, from the files named by the CATEGORIES and CATEGORY_COUNTS
+    environment variables at that point, so paths set in .env are picked up even though this module is imported first.
+    """
+    _ids: Mapping[str, str] | None
+    _counts: Mapping[str, CategoryCounts]
+
+    def __init__(self, ids: dict[str, str] | None = None, counts_file: str | None = None):
+        self._ids = None
+        self._counts = MappingProxyType({})
+        self._counts_file = counts_file
+        if ids is not None:
+            self._set_ids(ids)
+
+    @classmethod
+    def load(cls, categories_file: str, counts_file: str | None = None) -> "CategoryRegistry":
+        registry = cls(counts_file=counts_file)
+        registry._load(categories_file)
+        return registry
+
+    def _set_ids(self, ids: dict[str, str]):
+        self._ids = MappingProxyType(dict(ids))
+        if self._counts_file is not None and os.path.exists(self._counts_file):
+            self._counts = MappingProxyType(self._read_counts(self._counts_file))
+
+    def _load(self, categories_file: str):
+        with open(categories_file, "r") as f:
+            self._set_ids(json.load(f))
+
+    def _loaded_ids(self) -> Mapping[str, str]:
+        if self._ids is None:
+            self._counts_file = os.getenv("CATEGORY_COUNTS") or os.path.join(_RESOURCE_DIR, "category_counts.json")
+            self._load(os.getenv("CATEGORIES") or os.path.join(_RESOURCE_DIR, "categories.json"))
+        return self._ids
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._loaded_ids()
+
+    def names(self) -> list[str]:
+        return list(self._loaded_ids().keys())
+
+    def id_of(self, name: str) -> str:
+        return self._loaded_ids()[name]
+
+    def get_counts(self, name: str) -> CategoryCounts | None:
+        self._loaded_ids()
+        return self._counts.get(name)
+
+    def cap(self, name: str, difficulty: str, num: int) -> int:
+        """
+        :return: num, capped to the number of questions available for the category and difficulty, if known
+        """
+        self._loaded_ids()
+        counts = self._counts.get(name)
+        if counts is None:
+            return min(num, MAX_QUESTIONS)
+        return min(num, MAX_QUESTIONS, counts.for_difficulty(difficulty))
+
+    # Question counts
+    @staticmethod
+    def _read_counts(path: str) -> dict[str, CategoryCounts]:
+        with open(path, "r") as f:
+            return {name: CategoryCounts(**counts) for name, counts in json.load(f).items()}
+
+    def _write_counts(self, counts: dict[str, CategoryCounts]):
+        tmp_file = self._counts_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({name: counts.__dict__ for name, counts in counts.items()}, f, indent=2)
+        os.replace(tmp_file, self._counts_file)
+
+    def refresh_counts(self):
+        # Blocking, run it off the event loop
+        counts = {}
+        for name, cat_id in self._loaded_ids().items():
+            with requests.request("GET", API_COUNT_URL + cat_id, timeout=10) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"Question count request for {name} failed with code {response.status_code}")
+                q_counts = response.json()["category_question_count"]
+            counts[name] = CategoryCounts(total=q_counts["total_question_count"],
+                                          easy=q_counts["total_easy_question_count"],
+                                          medium=q_counts["total_medium_question_count"],
+                                          hard=q_counts["total_hard_question_count"])
+        # Swap in the whole mapping at once, readers never see a partial refresh
+        self._counts = MappingProxyType(counts)
+        if self._counts_file is not None:
+            self._write_counts(counts)
+
+    async def refresh_forever(self, logger, interval: float = REFRESH_INTERVAL):
+        while True:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.refresh_counts)
+                logger.info("Refreshed question counts for %s categories", len(self._counts))
+            except (requests.RequestException, RuntimeError, KeyError, ValueError) as err:
+                logger.warning("Failed to refresh question counts: %r", err)
+            await asyncio.sleep(interval)
+
+
+# Loaded on first use
+CATEGORIES = CategoryRegistry()
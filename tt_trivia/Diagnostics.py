@@ -0,0 +1,179 @@
+import asyncio
+import collections
+import gc
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from logging import Logger
+
+# Callbacks that hold the loop longer than this (in seconds) are reported
+SLOW_CALLBACK_DURATION = float(os.getenv("DIAG_SLOW_CALLBACK", 0.1))
+# Sampling interval of the profiler, and the longest a single profile may run
+PROFILE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 300
+TRACE_FRAMES = 10
+TOP_ALLOCATIONS = 5
+# Game tasks are named "ttt-game:{channel id}:{what}" so slow callbacks can be traced back to a game
+TASK_NAME_PREFIX = "ttt-game"
+_TASK_NAME_PATTERN = re.compile(rf"name='{TASK_NAME_PREFIX}:(\d+):(\w+)'")
+
+
+def game_task_name(channel_id: int, what: str) -> str:
+    return f"{TASK_NAME_PREFIX}:{channel_id}:{what}"
+
+
+class _SlowCallbackFilter(logging.Filter):
+    """
+    Filter for the asyncio logger that tags slow callback warnings with the game and channel that caused them.
+    """
+    def __init__(self, diagnostics: "Diagnostics"):
+        super().__init__()
+        self._diagnostics = diagnostics
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not isinstance(record.msg, str) or not record.msg.startswith("Executing") or not record.args:
+            return True
+        match = _TASK_NAME_PATTERN.search(str(record.args[0]))
+        if match is not None:
+            channel_id, what = int(match.group(1)), match.group(2)
+            record.channel_id = channel_id
+            record.msg = f"[channel {channel_id} {self._diagnostics.describe_game(channel_id)} {what}] " + record.msg
+        return True
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the event loop thread's stack from a background thread. Output is written in
+    the collapsed "frame;frame;frame count" format understood by flamegraph.pl and speedscope.
+    """
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self._thread_id = thread_id
+        self._interval = interval
+        self._samples = collections.Counter()
+        self._stop = threading.Event()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        if stack:
+            self._samples[";".join(reversed(stack))] += 1
+
+    def run(self, seconds: float):
+        end = time.perf_counter() + seconds
+        while not self._stop.is_set() and time.perf_counter() < end:
+            self._sample()
+            self._stop.wait(self._interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def write(self, path: str) -> int:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._samples.items():
+                f.write(f"{stack} {count}\n")
+        return sum(self._samples.values())
+
+
+class Diagnostics:
+    """
+    Opt-in diagnostics mode: slow callback reporting, an on demand sampling profiler and tracemalloc reports for
+    hunting down leaks. Games only record their traced memory total; full snapshots are taken on demand, off the event
+    loop, since taking one is slow enough to be a slow callback itself.
+    """
+    _baselines: weakref.WeakKeyDictionary
+    _last_snapshot: tracemalloc.Snapshot | None
+    _profiling: bool
+
+    def __init__(self, bot, logger: Logger, out_dir: str = "."):
+        self._bot = bot
+        self._logger = logger
+        self._out_dir = out_dir
+        # Traced memory when each game started. Keyed weakly by game, so games which are never garbage collected stick
+        # around in the report
+        self._baselines = weakref.WeakKeyDictionary()
+        # The previous memory report's snapshot, which the next one is compared against
+        self._last_snapshot = None
+        self._profiling = False
+
+    def enable(self, loop: asyncio.AbstractEventLoop):
+        loop.set_debug(True)
+        loop.slow_callback_duration = SLOW_CALLBACK_DURATION
+        asyncio_logger = logging.getLogger("asyncio")
+        asyncio_logger.addFilter(_SlowCallbackFilter(self))
+        for handler in self._logger.handlers:
+            asyncio_logger.addHandler(handler)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        self._logger.info(f"Diagnostics enabled. Slow callback threshold: {SLOW_CALLBACK_DURATION}s")
+
+    def describe_game(self, channel_id: int) -> str:
+        game = self._bot.get_game(channel_id) if self._bot.has_game(channel_id) else None
+        return type(game).__name__ if game is not None else "no game"
+
+    # Memory tracking
+    def track_game(self, game):
+        self._baselines[game] = tracemalloc.get_traced_memory()[0]
+
+    def release_game(self, game):
+        baseline = self._baselines.get(game)
+        if baseline is None:
+            return
+        delta = tracemalloc.get_traced_memory()[0] - baseline
+        self._logger.info(f"Game {game.get_channel_id()} traced memory delta: {delta / 1024:+.1f} KiB")
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    async def leak_report(self) -> str:
+        from FFAMultiChoice import McQuestionView
+        views = collections.Counter(obj._channel_id for obj in gc.get_objects() if isinstance(obj, McQuestionView))
+        traced = tracemalloc.get_traced_memory()[0]
+        report = f"Traced memory: {traced / 1024:.1f} KiB\n"
+        for game, baseline in list(self._baselines.items()):
+            c_id = game.get_channel_id()
+            status = "running" if self._bot.has_game(c_id) and self._bot.get_game(c_id) is game else "**retained**"
+            pending = sum(1 for task in game._task_stack if task is not None and not task.done())
+            report += f"\nGame {c_id} ({type(game).__name__}, {status}):"
+            report += f"\n\t- traced memory since it started: {(traced - baseline) / 1024:+.1f} KiB"
+            report += f"\n\t- question views alive: {views[c_id]}"
+            report += f"\n\t- task stack: {len(game._task_stack)} ({pending} pending)"
+        # Snapshotting and diffing are the slow part, so they run on a worker thread
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, self._take_snapshot)
+        if self._last_snapshot is not None:
+            stats = await loop.run_in_executor(None, snapshot.compare_to, self._last_snapshot, "lineno")
+            report += "\n\nLargest changes since the last report:"
+            for stat in stats[:TOP_ALLOCATIONS]:
+                report += f"\n\t- {stat}"
+        self._last_snapshot = snapshot
+        return report
+
+    # Profiling
+    async def profile(self, seconds: float) -> tuple[str, int]:
+        if self._profiling:
+            raise RuntimeError("A profile is already running")
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        profiler = SamplingProfiler(threading.get_ident())
+        path = os.path.join(self._out_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        self._profiling = True
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, profiler.run, seconds)
+        finally:
+            profiler.stop()
+            self._profiling = False
+        samples = profiler.write(path)
+        self._logger.info(f"Wrote {samples} profile samples to {path}")
+        return path, samples
@@ -0,0 +1,103 @@
+from QuestionSet import QuestionSet, FreeQuestion, Qtype
+import nextcord
+from FFAGame import GameStatus, ANSWER_TIME
+from FFAMultiChoice import FFAMultiChoice
+from AnswerMatcher import AnswerMatcher
+from GameClock import Clock
+from GameLogging import StructuredMessage
+
+
+class FFAFreeResponse(FFAMultiChoice):
+    """
+    Free for all where players type in their answer. Guesses are graded as they arrive, against a fuzzy matcher
+    built once per question, and players may keep guessing until they get it right.
+    """
+    _current_question: FreeQuestion | None
+    _matcher: AnswerMatcher | None
+    _correct_players: set[int]
+    _game_name = "Free Response FFA"
+
+    def __init__(self, q_set_kwargs: dict[str, str], g_id: int, bot, logger, clock: Clock | None = None,
+                 channel_id: int | None = None):
+        super().__init__(q_set_kwargs, g_id, bot, logger, clock, channel_id)
+        self._questions = QuestionSet(Qtype.FREE_RESPONSE, **q_set_kwargs)
+        self._matcher = None
+        self._correct_players = set()
+
+    def receive_answer(self, message: nextcord.Message):
+        if self._matcher is None:
+            raise RuntimeError(f"receive_answer called for game {self.get_channel_id()} when no question was set.")
+        player = self._admit_answer(message.author.id, message.content)
+        # Players who already got it and players who voted to skip are done for this question
+        if player is None or player.id in self._correct_players or player.answer == "skip!":
+            return
+        # Every guess is an answer here, and each one costs a fuzzy match
+        if not self._take_answer_token(player):
+            return
+        guess = message.content.strip()
+        self._answer_log.debug(StructuredMessage("guess", game=self._channel_id, player=player.id, guess=guess))
+        if guess.lower() == "skip!":
+            player.answer = "skip!"
+            self._answer_locked_in()
+        else:
+            player.answer = guess
+            if self._matcher.matches(guess):
+                self._correct_players.add(player.id)
+                self._stamp_answer(player, message.created_at)
+                self._answer_locked_in()
+
+    def receive_button_answer(self, answer: str, interaction: nextcord.Interaction):
+        # Free response questions have no buttons
+        pass
+
+    async def _ask_next_question(self):
+        self._logger.info("Asking Question")
+        question: FreeQuestion = next(self._questions, None)
+        # If none, then we're outta questions end the game
+        if question is None:
+            self._logger.info("All outta questions")
+            await self._set_status(GameStatus.ENDING)
+            return
+        self._current_question = question
+        self._matcher = AnswerMatcher(question.answer)
+        q_str = f"**Question No {self._questions.get_index()}:**\n"
+        q_str += f"{question.question}\n\n"
+        self._mark_question_delivered(await self._trivia_bot.say(self._channel_id, q_str))
+        await self._trivia_bot.say(self._channel_id, f"\n{ANSWER_TIME} seconds to type your answer.\n\n",
+                                   "question_ready.wav")
+        await self._set_status(GameStatus.WAIT_ANSWERS)
+
+    async def _end_question(self):
+        if self._skip_question():
+            self._skipped_questions += 1
+            await self._trivia_bot.say(self._channel_id, "**Question skipped!**\n\n")
+        # Guesses were graded on arrival, so just tally up
+        else:
+            correct = []
+            correct_msg = f"Correct Answer: {self._current_question.answer}\nCorrect Players:"
+            scores_msg = "Scores:"
+            for player in self._players.values():
+                if player.id in self._correct_players:
+                    player.score += self._points(player)
+                    player.streak += 1
+                    correct.append(player)
+                    correct_msg += f"\n\t- {player.name}"
+                else:
+                    player.perfect = False
+                    player.streak = 0
+                scores_msg += f"\n\t- {player.name}: {player.score}"
+                self._grading_log.debug(StructuredMessage(
+                    "graded", game=self._channel_id, player=player.id, score=player.score, streak=player.streak,
+                    answer=player.answer))
+                self._record_answer_stats(player)
+            question_sum_msg = correct_msg + "\n" + scores_msg + "\n\n"
+            await self._trivia_bot.say(self._channel_id, question_sum_msg, None)
+            await self._question_report(correct)
+        self._reset_answers()
+        # Game flow should allow a brief pause here
+        await self._clock.sleep(5)
+        await self._set_status(GameStatus.ASKING)
+
+    def _reset_answers(self):
+        super()._reset_answers()
+        self._correct_players.clear()
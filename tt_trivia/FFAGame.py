@@ -3,9 +3,16 @@ import enum
 import asyncio
 from logging import Logger
 from collections import deque
+from datetime import datetime
 import time
 import random
 import QuestionSet
+import GameLogging
+from GameClock import Clock, REAL_CLOCK
+from GameRecorder import GameRecorder
+from RateLimit import TokenBucket
+from StatsStore import StatsStore
+from LatencyStats import LatencyHistogram
 from Player import Player
 import nextcord
 
@@ -16,6 +23,19 @@ SKIP_THRESHOLD = 2/3
 MAX_PLAYERS = 20
 ANSWER_TIME = 20
 WAIT_PLAYERS = 20
+# Answer throttling: each player can send ANSWER_BURST answers at once, refilled at ANSWER_RATE per second.
+# Longer messages than MAX_ANSWER_LENGTH are never answers
+ANSWER_RATE = 1.0
+ANSWER_BURST = 5
+MAX_ANSWER_LENGTH = 200
+# Speed scoring: a correct answer is worth SPEED_MAX_POINTS if instant, falling to half that at the buzzer. In lives
+# mode, a correct answer in the first SPEED_BONUS_FRACTION of the answer window wins back a life
+SPEED_MAX_POINTS = 10
+SPEED_BONUS_FRACTION = 0.25
+# Close the answer window early once every player has answered or voted to skip, after a short grace period so
+# last second changes of mind still count
+EARLY_CLOSE = True
+ANSWER_GRACE = 1.0
 
 
 class GameStatus(enum.Enum):
@@ -29,6 +49,11 @@ class GameStatus(enum.Enum):
     STOPPED = 7
 
 
+def speed_points(answer_time: float) -> int:
+    fraction = min(max(answer_time / ANSWER_TIME, 0.0), 1.0)
+    return round(SPEED_MAX_POINTS * (1 - fraction / 2))
+
+
 class FFAGame(ABC):
     _status: GameStatus
     _sound_files: dict[str, str]
@@ -36,24 +61,71 @@ class FFAGame(ABC):
     _player_count: int
     _questions: QuestionSet
     _guild_id: int
+    _channel_id: int
     _current_question: QuestionSet.Question | None
-    _current_view: nextcord.ui.View | None
+    _question_message_id: int | None
     _skipped_questions: int
     _task_stack: deque[asyncio.Task]
     _logger: Logger
+    _clock: Clock
+    _recorder: GameRecorder | None
+    _stats: StatsStore | None
+    _answer_log: Logger
+    _grading_log: Logger
+    _answer_buckets: dict[int, TokenBucket]
+    _last_answers: dict[int, str]
+    _speed_scoring: bool
+    _question_delivered: float
+    _question_created_at: datetime | None
+    _question_latency: LatencyHistogram
+    _player_latency: dict[int, LatencyHistogram]
+    _gateway_lag: LatencyHistogram
+    _early_close: bool
+    _answered_count: int
+    _all_answered: asyncio.Event
 
     # Abstract methods
     @abstractmethod
-    def __init__(self, g_id, bot, logger):
+    def __init__(self, g_id, bot, logger, clock: Clock | None = None, channel_id: int | None = None):
         self._status = GameStatus.STARTING
         self._players = {}
         self._player_count = 0
         self._guild_id = g_id
+        # Games are run per channel (or thread), several can run in the same guild
+        self._channel_id = channel_id if channel_id is not None else g_id
         self._trivia_bot = bot
         self._current_question = None
         self._skipped_questions = 0
         self._task_stack = deque(maxlen=250)
         self._logger = logger
+        self._answer_log = logger.getChild(GameLogging.ANSWERS)
+        self._grading_log = logger.getChild(GameLogging.GRADING)
+        # All game timing goes through the clock, so simulations can run games faster than real time
+        self._clock = clock if clock is not None else REAL_CLOCK
+        self._recorder = None
+        self._stats = None
+        self._answer_buckets = {}
+        self._last_answers = {}
+        # Answer messages dropped before the game looked at them, by reason
+        self._dropped_non_player = 0
+        self._dropped_duplicate = 0
+        self._dropped_oversized = 0
+        self._speed_scoring = False
+        # When the current question was delivered, by the game clock and by Discord's timestamp if there is one
+        self._question_delivered = self._clock.now()
+        self._question_created_at = None
+        # Buttons on any other message belong to an earlier question
+        self._question_message_id = None
+        # Reaction times: Discord timestamp of the answer minus that of the question when both are known, so they
+        # measure the player and not the gateway. Gateway lag is how long answers took to reach us
+        self._question_latency = LatencyHistogram()
+        self._player_latency = {}
+        self._gateway_lag = LatencyHistogram()
+        self._early_close = EARLY_CLOSE
+        # Players who have locked in an answer (or a skip vote) for the current question
+        self._answered_count = 0
+        self._all_answered = asyncio.Event()
+        self._dropped_throttled = 0
         self._sound_files = {
             "prepare": "prepare.wav",
             "countdown": "countdown5.wav"
@@ -73,43 +145,193 @@ class FFAGame(ABC):
 
     # inheritable methods
     def add_player(self, player_user: nextcord.user) ->  bool:
+        if self._recorder is not None:
+            self._recorder.join(self._clock.now(), player_user.id, player_user.name)
         if self._status == GameStatus.GETTING_PLAYERS:
             p_name = player_user.name
             p_id = player_user.id
             if id not in self._players:
                 player = Player(p_name, p_id, 0, 0, True)
                 self._players[p_id] = player
+                self._answer_buckets[p_id] = TokenBucket(ANSWER_RATE, ANSWER_BURST, self._clock.now())
+                self._player_latency[p_id] = LatencyHistogram()
                 self._player_count += 1
-                self._logger.info(f"Added player {player}")
+                self._logger.info("Added player %s to game %s", p_name, self._channel_id)
                 return True
         return False
 
+    def _admit_answer(self, user_id: int, content: str, button: bool = False) -> Player | None:
+        """
+        Cheap checks every answer goes through before the game looks at it, so spam has a fixed cost: only players
+        may answer, and a repeat of a player's last answer this question is dropped. Answers that are actually valid
+        are then rate limited with _take_answer_token, so chatting during a question doesn't use up a player's answers.
+        :return: the player, if the answer should be handled
+        """
+        player = self._players.get(user_id)
+        if player is None:
+            self._dropped_non_player += 1
+            return None
+        if self._recorder is not None:
+            if button:
+                self._recorder.button(self._clock.now(), user_id, content)
+            else:
+                self._recorder.answer(self._clock.now(), user_id, content)
+        if len(content) > MAX_ANSWER_LENGTH:
+            self._dropped_oversized += 1
+            return None
+        if self._last_answers.get(user_id) == content:
+            self._dropped_duplicate += 1
+            return None
+        self._last_answers[user_id] = content
+        return player
+
+    def _take_answer_token(self, player: Player) -> bool:
+        # Per player rate limit on valid answers. False if the answer should be dropped
+        if self._answer_buckets[player.id].try_take(self._clock.now()):
+            return True
+        self._dropped_throttled += 1
+        return False
+
+    def _mark_question_delivered(self, message: nextcord.Message | None):
+        # Answer times are measured from here
+        self._question_delivered = self._clock.now()
+        if self._recorder is not None:
+            self._recorder.delivered(self._question_delivered)
+        self._question_created_at = message.created_at if message is not None else None
+        self._question_message_id = message.id if message is not None else None
+        self._question_latency = LatencyHistogram()
+
+    def _stamp_answer(self, player: Player, sent_at: datetime | None):
+        # The answer time is the latest answer's, for scoring. Reaction times are only sampled for a player's first
+        # answer to each question, so changing answers doesn't skew the histograms
+        first_answer = player.answer_time is None
+        player.answer_time = self._clock.now() - self._question_delivered
+        if sent_at is not None and self._question_created_at is not None:
+            self._gateway_lag.add(max(0.0, time.time() - sent_at.timestamp()))
+        if not first_answer:
+            return
+        if sent_at is not None and self._question_created_at is not None:
+            reaction = (sent_at - self._question_created_at).total_seconds()
+        else:
+            reaction = player.answer_time
+        self._question_latency.add(reaction)
+        self._player_latency[player.id].add(reaction)
+
+    def _answer_locked_in(self):
+        # Call the first time each player answers or votes to skip a question
+        self._answered_count += 1
+        if self._early_close and self._answered_count >= len(self._players):
+            self._all_answered.set()
+
+    def _reset_answer_count(self):
+        self._answered_count = 0
+        self._all_answered.clear()
+
+    async def _wait_or_all_answered(self, seconds: float) -> bool:
+        """
+        Wait out part of the answer window, or less if every player answers first.
+        :return: True if every player has answered
+        """
+        if self._all_answered.is_set():
+            return True
+        timer = asyncio.create_task(self._clock.sleep(seconds))
+        answered = asyncio.create_task(self._all_answered.wait())
+        try:
+            await asyncio.wait((timer, answered), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            timer.cancel()
+            answered.cancel()
+        return self._all_answered.is_set()
+
+    def _points(self, player: Player) -> int:
+        # Points for a correct answer
+        if not self._speed_scoring or player.answer_time is None:
+            return 1
+        return speed_points(player.answer_time)
+
+    def set_speed_scoring(self, speed_scoring: bool):
+        self._speed_scoring = speed_scoring
+
+    def set_early_close(self, early_close: bool):
+        self._early_close = early_close
+
+    def get_latency_report(self) -> str:
+        report = f"gateway lag: {self._gateway_lag}"
+        for player in self._players.values():
+            report += f"\n\t- {player.name} reaction time: {self._player_latency[player.id]}"
+        return report
+
+    def get_dropped_answers(self) -> dict[str, int]:
+        return {"non_player": self._dropped_non_player, "duplicate": self._dropped_duplicate,
+                "oversized": self._dropped_oversized, "throttled": self._dropped_throttled}
+
     async def start(self):
         random.seed(time.time())
+        if self._recorder is not None:
+            self._recorder.start(self._clock.now())
+            self._recorder.options(self._clock.now(), {"speed_scoring": self._speed_scoring,
+                                                          "early_close": self._early_close})
         if not self._questions.is_initialized():
             await self._questions.initialize()
+        self._record_questions()
         await self._set_status(GameStatus.GETTING_PLAYERS)
 
     async def end(self):
+        if self._recorder is not None:
+            self._recorder.end(self._clock.now())
         await self._set_status(GameStatus.STOPPED)
 
+    def set_recorder(self, recorder: GameRecorder):
+        self._recorder = recorder
+
+    def get_recorder(self) -> GameRecorder | None:
+        return self._recorder
+
+    def _record_questions(self):
+        if self._recorder is not None:
+            self._recorder.questions(self._clock.now(), self._questions.get_q_type(), self._questions.get_questions())
+
+    def set_stats_store(self, stats: StatsStore):
+        self._stats = stats
+
+    def _record_answer_stats(self, player: Player):
+        # Called once the player's answer is graded. A correct answer always leaves a streak of at least 1
+        if self._stats is not None:
+            self._stats.record_answer(self._guild_id, player.id, player.name, player.streak > 0, player.streak)
+
+    def _record_game_stats(self, players: list[Player], winners: list[Player]):
+        if self._stats is not None:
+            winner_ids = {winner.id for winner in winners}
+            for player in players:
+                self._stats.record_game(self._guild_id, player.id, player.name, player.id in winner_ids,
+                                        player.is_perfect())
+
     def get_guild_id(self):
         return self._guild_id
 
+    def get_num_questions(self) -> int:
+        return self._questions.get_num_questions()
+
+    def get_channel_id(self):
+        return self._channel_id
+
     def get_state(self):
         return self._status
 
+    def is_question_message(self, message_id: int) -> bool:
+        return message_id == self._question_message_id
+
     async def _handle_failed_game(self, e: Exception):
         self._logger.exception(f"Critical failure encountered: {e}")
         self._flush_tasks()
         self._trivia_bot.cleanup_game(self)
-        await self._trivia_bot.say(self._guild_id, "Critical error encountered. Stopping game.")
+        await self._trivia_bot.say(self._channel_id, "Critical error encountered. Stopping game.")
 
     async def _stop_game(self):
-        print(f"game stopped")
+        self._logger.info("Game %s stopped", self._channel_id)
         self._flush_tasks()
         self._trivia_bot.cleanup_game(self)
-        await self._trivia_bot.say(self._guild_id, "Game stopped.")
+        await self._trivia_bot.say(self._channel_id, "Game stopped.")
 
     def _flush_tasks(self):
         # Method to cancel up the coroutine tasks in the task stack
@@ -119,29 +341,42 @@ class FFAGame(ABC):
                 task.cancel()
 
     async def _wait_answers(self):
-        await asyncio.sleep(ANSWER_TIME - 5)
-        start = time.perf_counter()
-        await self._trivia_bot.say(self._guild_id, "5 seconds left!", self._sound_files["countdown"])
-        end = time.perf_counter()
-        # Pad out the full 5 seconds
-        await asyncio.sleep(5 - (end-start))
+        start = self._clock.now()
+        answered = await self._wait_or_all_answered(ANSWER_TIME - 5)
+        if not answered:
+            countdown = asyncio.create_task(self._trivia_bot.say(self._channel_id, "5 seconds left!",
+                                                                 self._sound_files["countdown"]))
+            try:
+                answered = await self._wait_or_all_answered(5)
+                if answered:
+                    countdown.cancel()
+                    self._trivia_bot.stop_sound(self._channel_id, self._sound_files["countdown"])
+                else:
+                    # The countdown may still be waiting for the voice channel
+                    await countdown
+            finally:
+                if not countdown.done():
+                    countdown.cancel()
+        if answered:
+            self._logger.info("Game %s: everyone answered after %.1fs", self._channel_id, self._clock.now() - start)
+            await self._clock.sleep(ANSWER_GRACE)
         await self._set_status(GameStatus.QUESTION_RESULTS)
 
     async def _wait_players(self, game_name):
         self._logger.info("Waiting for players")
-        await self._trivia_bot.say(self.get_guild_id(),
+        await self._trivia_bot.say(self._channel_id,
                                    f"Game starting in {WAIT_PLAYERS} seconds. Type \"play\" to join!\n\n")
         half_wait = round(WAIT_PLAYERS/2)
-        start = time.perf_counter()
-        await asyncio.sleep(half_wait)
-        await self._trivia_bot.say(self.get_guild_id(),
+        start = self._clock.now()
+        await self._clock.sleep(half_wait)
+        await self._trivia_bot.say(self._channel_id,
                                    f"Game starting in {half_wait} seconds. Type \"play\" to join!\n\n")
-        await asyncio.sleep(half_wait)
-        end = time.perf_counter()
-        self._logger.info(f"Waited {end - start:.4f} seconds. ")
+        await self._clock.sleep(half_wait)
+        end = self._clock.now()
+        self._logger.info("Waited %.4f seconds for players", end - start)
         # if nobody played, cleanup and exit
         if self._player_count < 1:
-            await self._trivia_bot.say(self._guild_id, "Nobody wanted to play... sad.")
+            await self._trivia_bot.say(self._channel_id, "Nobody wanted to play... sad.")
             await self._set_status(GameStatus.ENDING)
             return
         start_msg = f"\n**Starting {game_name}\t difficulty: {self._questions.get_difficulty()}\t category: {self._questions.get_category()}\n**"
@@ -152,6 +387,6 @@ class FFAGame(ABC):
         for player in self._players.values():
             start_msg += f"\n\t- {player.name}"
         start_msg += "\n\n"
-        await self._trivia_bot.say(self.get_guild_id(), start_msg, self._sound_files["prepare"])
-        await asyncio.sleep(5)
+        await self._trivia_bot.say(self._channel_id, start_msg, self._sound_files["prepare"])
+        await self._clock.sleep(5)
         await self._set_status(GameStatus.ASKING)
@@ -1,11 +1,14 @@
-from FFAGame import GameStatus, ANSWER_TIME
-from FFAMultiChoice import FFAMultiChoice, McQuestionView
+from FFAGame import GameStatus, ANSWER_TIME, SPEED_BONUS_FRACTION
+from FFAMultiChoice import FFAMultiChoice
 import nextcord
 import time
 import random
 from QuestionSet import QuestionSet, MCQuestion
 from Player import Player
-import asyncio
+from GameClock import Clock
+from GameLogging import StructuredMessage
+
+START_LIVES = 10
 
 
 class FFALives(FFAMultiChoice):
@@ -13,11 +16,11 @@ class FFALives(FFAMultiChoice):
     _current_question = QuestionSet
     _question_number: int
 
-    def __init__(self, q_set_kwargs: dict[str,str|int], g_id: int, bot, logger):
-        print("Called FFALives init")
+    def __init__(self, q_set_kwargs: dict[str,str|int], g_id: int, bot, logger, clock: Clock | None = None,
+                 channel_id: int | None = None):
         # Always grab 50 q's as
         q_set_kwargs["num"] = 50
-        super().__init__(q_set_kwargs, g_id, bot, logger)
+        super().__init__(q_set_kwargs, g_id, bot, logger, clock, channel_id)
         self._question_number = 1
         self._sound_files["prepare"] = "lives/start_match_with_klaxon.wav"
         self._sound_files["countdown"] = "lives/countdown_5_beeps.wav"
@@ -27,7 +30,7 @@ class FFALives(FFAMultiChoice):
         added = super().add_player(player_user)
         # Players in the game mode start with 10 lives
         if added:
-            self._players[player_user.id].score = 10
+            self._players[player_user.id].score = START_LIVES
         return added
 
     async def _ask_next_question(self):
@@ -38,24 +41,25 @@ class FFALives(FFAMultiChoice):
             self._logger.info("All outta questions")
             # get more questions
             await self._questions.initialize()
+            self._record_questions()
             question: MCQuestion = next(self._questions, None)
         self._current_question = question
-        q_view = McQuestionView(self)
-        self._current_view = q_view
         q_str = f"**Question No {self._question_number}:**\n"
         self._question_number += 1
         q_str += f"{question.question}"
         for char, answer in zip("abcd", question.choices):
             q_str += f"\n\t{char}. {answer}"
         q_str += "\n\n"
-        await self._trivia_bot.say(self._guild_id, q_str, view=q_view)
-        await self._trivia_bot.say(self._guild_id, f"\n{ANSWER_TIME} seconds to answer.\n\n", "question_ready.wav")
+        self._mark_question_delivered(await self._trivia_bot.say(self._channel_id, q_str,
+                                                                 view=self._get_question_view()))
+        await self._trivia_bot.say(self._channel_id, f"\n{ANSWER_TIME} seconds to answer.\n\n", "question_ready.wav")
         await self._set_status(GameStatus.WAIT_ANSWERS)
 
     async def _end_question(self):
+        game_over = False
         if self._skip_question():
             self._skipped_questions += 1
-            await self._trivia_bot.say(self._guild_id, "**Question skipped!**\n\n")
+            await self._trivia_bot.say(self._channel_id, "**Question skipped!**\n\n")
             # Loop over players, update their scores, streak, and perfect status
         else:
             incorrect = []
@@ -65,6 +69,10 @@ class FFALives(FFAMultiChoice):
             for player in self._players.values():
                 if player.answer != "skip!" and self._check_answer(player.answer):
                     player.streak += 1
+                    # In speed mode, a quick correct answer wins back a life
+                    if self._speed_scoring and player.answer_time is not None and player.score < START_LIVES and \
+                            player.answer_time < SPEED_BONUS_FRACTION * ANSWER_TIME:
+                        player.score += 1
                     correct_msg += f"\n\t- {player.name}"
                 else:
                     player.perfect = False
@@ -72,23 +80,28 @@ class FFALives(FFAMultiChoice):
                     player.score -= 1
                     incorrect.append(player)
                 scores_msg += f"\n\t- {player.name}: {player.score}"
-                self._logger.info(f"{player=}")
+                self._grading_log.debug(StructuredMessage(
+                    "graded", game=self._channel_id, player=player.id, lives=player.score, streak=player.streak,
+                    answer=player.answer))
+                self._record_answer_stats(player)
             question_sum_msg = correct_msg + "\n" + scores_msg + "\n\n"
-            await self._trivia_bot.say(self._guild_id, question_sum_msg, None)
-            await self._question_report(incorrect)
-        self._current_view.stop()
+            await self._trivia_bot.say(self._channel_id, question_sum_msg, None)
+            game_over = await self._question_report(incorrect)
+        # Answers are cleared before the next status change, so the next question starts from a clean slate
         self._reset_answers()
+        if game_over:
+            await self._set_status(GameStatus.ENDING)
+            return
         # Game flow should allow a brief pause here
-        await asyncio.sleep(5)
+        await self._clock.sleep(5)
         await self._set_status(GameStatus.ASKING)
 
-    async def _question_report(self, incorrect_players: list[Player]):
+    async def _question_report(self, incorrect_players: list[Player]) -> bool:
         # Method to report the scores after the question, and announce streak callouts
         callouts = set()
         announcements = []
         for player in incorrect_players:
             # Streak == 0 --> player just answered incorrectly
-            print(player)
             life_pct = 10 * player.score
             status_msg = f"{player.name} health: {life_pct / 100:.0%}\n\n"
             if life_pct in {70, 50, 30, 10}:
@@ -101,8 +114,8 @@ class FFALives(FFAMultiChoice):
                     announcements.append((status_msg, status_wav))
                 else:
                     announcements.append((status_msg, None))
-        await self._trivia_bot.speak(self._guild_id, announcements)
-        await self._eliminate_players()
+        await self._trivia_bot.speak(self._channel_id, announcements)
+        return await self._eliminate_players()
 
     async def _end_game(self):
         # TODO: Implement complete override to _end_game where a random victory sound is played
@@ -113,27 +126,29 @@ class FFALives(FFAMultiChoice):
         game_report = "Final scores:\n"
         for i, player in enumerate(players):
             game_report += f"{i + 1}. {player}: {player.score}\n"
+        winners: list[Player] = [p for p in players if p.score == winner.score]
+        self._record_game_stats(players, winners)
         # check for ties
-        if len(players) > 1 and players[1].score == winner.score:
-            winners: list[Player] = list(map(lambda p: p.score == winner.score, players))
+        if len(winners) > 1:
             tie_result = f"@everyone There was a {len(winners)} way tie! Winners:\n"
             for winner in winners:
                 tie_result += f"\n\t- {winner.name}"
-                await self._trivia_bot.say(self._guild_id, tie_result)
+            await self._trivia_bot.say(self._channel_id, tie_result)
         else:
             num = random.randint(1, 3)
-            await self._trivia_bot.say(self._guild_id, f"<@{winner.id}> is the winner with {winner.score} points!",
+            await self._trivia_bot.say(self._channel_id, f"<@{winner.id}> is the winner with {winner.score} points!",
                                        f"lives/victory{num}.wav")
             # Quite an achievement
             self._logger.info("checking if player is perfect")
             if winner.is_perfect():
-                await self._trivia_bot.say(self._guild_id, f"<@{winner.id}> was perfect for the game!", "flawless.wav")
-        await self.end()
+                await self._trivia_bot.say(self._channel_id, f"<@{winner.id}> was perfect for the game!", "flawless.wav")
+        await self._set_status(GameStatus.STOPPED)
 
-    async def _eliminate_players(self):
+    async def _eliminate_players(self) -> bool:
+        # Removes players who are out of lives. Returns whether the game is over, the caller moves the game on
         players_to_cull = [player.id for player in self._players.values() if player.score < 1]
         if not players_to_cull:
-            return
+            return False
         announcements = None
         # In case of a tie where everyone is out in one go, give everyone one life
         if len(players_to_cull) == len(self._players):
@@ -142,17 +157,15 @@ class FFALives(FFAMultiChoice):
             announcement = ("It's a tie! All players lives set to 1.", "lives/tie.wav")
         else:
             announcement_msg = "Players eliminated:"
+            self._record_game_stats([self._players[player_id] for player_id in players_to_cull], [])
             for player_id in players_to_cull:
                 player_name = self._players[player_id].name
                 announcement_msg += f"\n\t- {player_name}"
                 del self._players[player_id]
             announcement = (announcement_msg, f"lives/lose{random.randint(1, 4)}.wav")
-        self._logger.info(f"Players left: {[player.name for player in self._players.values()]}")
-        await self._trivia_bot.say(self._guild_id, announcement[0], announcement[1])
-        if len(self._players) == 1:
-            await self._set_status(GameStatus.ENDING)
-        else:
-            await self._set_status(GameStatus.ASKING)
+        self._logger.info("Game %s players left: %s", self._channel_id, len(self._players))
+        await self._trivia_bot.say(self._channel_id, announcement[0], announcement[1])
+        return len(self._players) == 1
 
 
 
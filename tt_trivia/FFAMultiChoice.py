@@ -3,39 +3,75 @@ import nextcord
 from Player import Player
 import asyncio
 from FFAGame import GameStatus, FFAGame, SKIP_THRESHOLD, ANSWER_TIME, WAIT_PLAYERS
+from Diagnostics import game_task_name
+from GameClock import Clock
+from GameLogging import StructuredMessage
+
+# Answers that are valid for any multiple choice question
+MC_ANSWERS = frozenset({"a", "b", "c", "d", "skip!"})
+# Question buttons have custom ids "ttt:{channel id}:{choice}", which TriviaBot routes straight to the channel's game
+BUTTON_PREFIX = "ttt"
+BUTTON_STYLES = (("a", nextcord.ButtonStyle.green), ("b", nextcord.ButtonStyle.red),
+                 ("c", nextcord.ButtonStyle.blurple), ("d", nextcord.ButtonStyle.grey))
+BUTTON_CHOICES = frozenset(choice for choice, _ in BUTTON_STYLES)
+
+
+def button_id(channel_id: int, choice: str) -> str:
+    return f"{BUTTON_PREFIX}:{channel_id}:{choice}"
+
+
+def parse_button_id(custom_id: str) -> tuple[int, str] | None:
+    # (channel id, choice) for a question button's custom id, None for anything else
+    parts = custom_id.split(":")
+    if len(parts) != 3 or parts[0] != BUTTON_PREFIX or not parts[1].isdigit() or parts[2] not in BUTTON_CHOICES:
+        return None
+    return int(parts[1]), parts[2]
 
 
 class FFAMultiChoice(FFAGame):
     _current_question: MCQuestion | None
+    _game_name = "Multiple Choice FFA"
+    _valid_answers: frozenset[str] | None
+    _question_view: "McQuestionView | None"
 
-    def __init__(self, q_set_kwargs: dict[str, str], g_id: int, bot, logger):
-        super().__init__(g_id, bot, logger)
+    def __init__(self, q_set_kwargs: dict[str, str], g_id: int, bot, logger, clock: Clock | None = None,
+                 channel_id: int | None = None):
+        super().__init__(g_id, bot, logger, clock, channel_id)
         self._questions = QuestionSet(Qtype.MULTI_CHOICE, **q_set_kwargs)
         self._sound_files["prepare"] = "prepare.wav"
+        # Valid answers to the current question, built on its first answer
+        self._valid_answers = None
+        # Sent with every question. Built on the first one, since views need a running event loop
+        self._question_view = None
 
     def receive_answer(self, message: nextcord.Message):
-        ans = message.content.lower().strip()
-        self._logger.info(f"Receiving answer {ans}")
         if self._current_question is None:
-            raise RuntimeError(f"record_answer called for game {self.get_guild_id()} when no question was set.")
-        # Skip if message was from non-player
-        if message.author.id not in self._players:
-            return
+            raise RuntimeError(f"record_answer called for game {self.get_channel_id()} when no question was set.")
+        player = self._admit_answer(message.author.id, message.content)
         # One a player skips, no taking back
-        if self._players[message.author.id].answer == "skip!":
+        if player is None or player.answer == "skip!":
             return
-        if ans in {"a", "b", "c", "d", "skip!"} or ans in [a.strip().lower() for a in self._current_question.choices]:
-            self._players[message.author.id].answer = ans
+        ans = message.content.lower().strip()
+        self._answer_log.debug(StructuredMessage("answer", game=self._channel_id, player=player.id, answer=ans))
+        if self._valid_answers is None:
+            self._valid_answers = MC_ANSWERS | {c.strip().lower() for c in self._current_question.choices}
+        if ans in self._valid_answers and self._take_answer_token(player):
+            if player.answer is None:
+                self._answer_locked_in()
+            player.answer = ans
+            self._stamp_answer(player, message.created_at)
 
     def receive_button_answer(self, answer: str, interaction: nextcord.Interaction):
-        u_id = interaction.user.id
-        if u_id not in self._players:
-            return
+        player = self._admit_answer(interaction.user.id, answer, button=True)
         # One a player skips, no taking back
-        if self._players[u_id].answer == "skip!":
+        if player is None or player.answer == "skip!" or not self._take_answer_token(player):
             return
-        self._players[u_id].answer = answer
-        self._logger.info(f"Set player {self._players[u_id].name}'s answer to {answer}")
+        if player.answer is None:
+            self._answer_locked_in()
+        player.answer = answer
+        self._stamp_answer(player, interaction.created_at)
+        self._answer_log.debug(StructuredMessage("button_answer", game=self._channel_id, player=player.id,
+                                                 answer=answer))
 
     async def _ask_next_question(self):
         self._logger.info("Asking Question")
@@ -46,17 +82,21 @@ class FFAMultiChoice(FFAGame):
             await self._set_status(GameStatus.ENDING)
             return
         self._current_question = question
-        q_view = McQuestionView(self)
-        self._current_view = q_view
         q_str = f"**Question No {self._questions.get_index()}:**\n"
         q_str += f"{question.question}"
         for char, answer in zip("abcd", question.choices):
             q_str += f"\n\t{char}. {answer}"
         q_str += "\n\n"
-        await self._trivia_bot.say(self._guild_id, q_str, view=q_view)
-        await self._trivia_bot.say(self._guild_id, f"\n{ANSWER_TIME} seconds to answer.\n\n", "question_ready.wav")
+        self._mark_question_delivered(await self._trivia_bot.say(self._channel_id, q_str,
+                                                                 view=self._get_question_view()))
+        await self._trivia_bot.say(self._channel_id, f"\n{ANSWER_TIME} seconds to answer.\n\n", "question_ready.wav")
         await self._set_status(GameStatus.WAIT_ANSWERS)
 
+    def _get_question_view(self) -> "McQuestionView":
+        if self._question_view is None:
+            self._question_view = McQuestionView(self._channel_id)
+        return self._question_view
+
     def _clear_last_question(self):
         self._current_question = None
         for player in self._players.values():
@@ -65,7 +105,7 @@ class FFAMultiChoice(FFAGame):
     async def _end_question(self):
         if self._skip_question():
             self._skipped_questions += 1
-            await self._trivia_bot.say(self._guild_id, "**Question skipped!**\n\n")
+            await self._trivia_bot.say(self._channel_id, "**Question skipped!**\n\n")
         # Loop over players, update their scores, streak, and perfect status
         else:
             correct = []
@@ -74,7 +114,7 @@ class FFAMultiChoice(FFAGame):
             scores_msg = "Scores:"
             for player in self._players.values():
                 if player.answer != "skip!" and self._check_answer(player.answer):
-                    player.score += 1
+                    player.score += self._points(player)
                     player.streak += 1
                     correct.append(player)
                     correct_msg += f"\n\t- {player.name}"
@@ -82,14 +122,16 @@ class FFAMultiChoice(FFAGame):
                     player.perfect = False
                     player.streak = 0
                 scores_msg += f"\n\t- {player.name}: {player.score}"
-                self._logger.info(f"{player=}")
+                self._grading_log.debug(StructuredMessage(
+                    "graded", game=self._channel_id, player=player.id, score=player.score, streak=player.streak,
+                    answer=player.answer))
+                self._record_answer_stats(player)
             question_sum_msg = correct_msg + "\n" + scores_msg + "\n\n"
-            await self._trivia_bot.say(self._guild_id, question_sum_msg, None)
+            await self._trivia_bot.say(self._channel_id, question_sum_msg, None)
             await self._question_report(correct)
-        self._current_view.stop()
         self._reset_answers()
         # Game flow should allow a brief pause here
-        await asyncio.sleep(5)
+        await self._clock.sleep(5)
         await self._set_status(GameStatus.ASKING)
 
     async def _question_report(self, correct_players: list[Player]):
@@ -107,7 +149,7 @@ class FFAMultiChoice(FFAGame):
                     announcements.append((steak_msg, streak_wav))
                 else:
                     announcements.append((steak_msg, None))
-        await self._trivia_bot.speak(self._guild_id, announcements)
+        await self._trivia_bot.speak(self._channel_id, announcements)
 
     def _check_answer(self, answer: str | None) -> bool:
         assert self._status == GameStatus.QUESTION_RESULTS
@@ -118,7 +160,7 @@ class FFAMultiChoice(FFAGame):
         if answer in {"a", "b", "c", "d"}:
             return self._current_question.answer_index == MCQuestion.get_index(answer)
         if self._current_question.answer is None:
-            self._logger.info(f"WTF {self._current_question.answer=}")
+            self._logger.warning("Question has no answer: %r", self._current_question)
         if self._current_question.answer.lower() == answer:
             return True
         return False
@@ -133,6 +175,11 @@ class FFAMultiChoice(FFAGame):
     def _reset_answers(self):
         for player in self._players.values():
             player.answer = None
+            player.answer_time = None
+        self._last_answers.clear()
+        self._valid_answers = None
+        self._reset_answer_count()
+        self._grading_log.debug("Game %s question reaction times: %s", self._channel_id, self._question_latency)
 
     async def _end_game(self):
         self._logger.info("ending game")
@@ -142,39 +189,43 @@ class FFAMultiChoice(FFAGame):
         game_report = "Final scores:\n"
         for i, player in enumerate(players):
             game_report += f"{i + 1}. {player}: {player.score}\n"
+        winners: list[Player] = [p for p in players if p.score == winner.score]
+        self._record_game_stats(players, winners)
         # check for ties
-        if len(players) > 1 and players[1].score == winner.score:
-            winners: list[Player] = list(map(lambda p: p.score == winner.score, players))
+        if len(winners) > 1:
             tie_result = f"@everyone There was a {len(winners)} way tie! Winners:\n"
             for winner in winners:
                 tie_result += f"\n\t- {winner.name}"
-                await self._trivia_bot.say(self._guild_id, tie_result)
+            await self._trivia_bot.say(self._channel_id, tie_result)
         else:
-            await self._trivia_bot.say(self._guild_id, f"<@{winner.id}> is the winner with {winner.score} points!",
+            await self._trivia_bot.say(self._channel_id, f"<@{winner.id}> is the winner with {winner.score} points!",
                                        "victory.wav")
             # Quite an achievement
             self._logger.info("checking if player is perfect")
             if winner.is_perfect():
-                await self._trivia_bot.say(self._guild_id, f"<@{winner.id}> was perfect for the game!", "flawless.wav")
+                await self._trivia_bot.say(self._channel_id, f"<@{winner.id}> was perfect for the game!", "flawless.wav")
 
     async def _set_status(self, status: GameStatus, **kwargs):
         # Transition function for various game states
         self._status = status
-        self._logger.info(f"Status of game {self._guild_id} set to {self._status}")
+        self._logger.info("Status of game %s set to %s", self._channel_id, self._status)
+        if self._recorder is not None:
+            self._recorder.status(self._clock.now(), status)
         task = None
         if self._status == GameStatus.FAILED:
             if len(kwargs) == 1 and isinstance(kwargs["err"], Exception):
                 await self._handle_failed_game(kwargs["err"])
                 return
+        task_name = game_task_name(self._channel_id, self._status.name)
         try:
             if self._status == GameStatus.GETTING_PLAYERS:
-                task = asyncio.create_task(self._wait_players("Multiple Choice FFA"))
+                task = asyncio.create_task(self._wait_players(self._game_name), name=task_name)
             elif self._status == GameStatus.ASKING:
-                task = asyncio.create_task(self._ask_next_question())
+                task = asyncio.create_task(self._ask_next_question(), name=task_name)
             elif self._status == GameStatus.WAIT_ANSWERS:
-                task = asyncio.create_task(self._wait_answers())
+                task = asyncio.create_task(self._wait_answers(), name=task_name)
             elif self._status == GameStatus.QUESTION_RESULTS:
-                task = asyncio.create_task(self._end_question())
+                task = asyncio.create_task(self._end_question(), name=task_name)
             elif self._status == GameStatus.ENDING:
                 if self._player_count > 0:
                     await self._end_game()
@@ -188,33 +239,20 @@ class FFAMultiChoice(FFAGame):
             self._task_stack.append(task)
             await task
         except Exception as e:
-            print(f"Caught exception {e}")
-            self._logger.error(e)
+            self._logger.error("Game %s caught exception: %r", self._channel_id, e)
             await self._set_status(GameStatus.FAILED, err=e)
 
 
 class McQuestionView(nextcord.ui.View):
     """
-    view class to render question button gui with callback to register answers from players.
+    Answer buttons for a game's questions. The view only renders the buttons, it never times out and is never added to
+    nextcord's view store: presses are routed by custom id in TriviaBot.on_interaction, so one view serves every
+    question of a game and buttons keep working across bot restarts.
     """
-    _game: FFAMultiChoice
-
-    def __init__(self, game: FFAMultiChoice):
-        super(McQuestionView, self).__init__()
-        self._game = game
-
-    @nextcord.ui.button(label="a", style=nextcord.ButtonStyle.green)
-    async def answer_a(self, btn: nextcord.ui.Button, interaction: nextcord.Interaction):
-        self._game.receive_button_answer("a", interaction)
-
-    @nextcord.ui.button(label="b", style=nextcord.ButtonStyle.red)
-    async def answer_b(self, btn: nextcord.ui.Button, interaction: nextcord.Interaction):
-        self._game.receive_button_answer("b", interaction)
-
-    @nextcord.ui.button(label="c", style=nextcord.ButtonStyle.blurple)
-    async def answer_c(self, btn: nextcord.ui.Button, interaction: nextcord.Interaction):
-        self._game.receive_button_answer("c", interaction)
+    _channel_id: int
 
-    @nextcord.ui.button(label="d", style=nextcord.ButtonStyle.grey)
-    async def answer_d(self, btn: nextcord.ui.Button, interaction: nextcord.Interaction):
-        self._game.receive_button_answer("d", interaction)
+    def __init__(self, channel_id: int):
+        super(McQuestionView, self).__init__(timeout=None, prevent_update=False)
+        self._channel_id = channel_id
+        for choice, style in BUTTON_STYLES:
+            self.add_item(nextcord.ui.Button(label=choice, style=style, custom_id=button_id(channel_id, choice)))
@@ -0,0 +1,112 @@
+from abc import ABC, abstractmethod
+import asyncio
+import selectors
+import time
+
+
+class Clock(ABC):
+    """
+    Source of time for the game engine. Games never call asyncio.sleep or time.perf_counter directly, so simulations
+    can run a game faster than real time without changing its timing semantics.
+    """
+    @abstractmethod
+    def now(self) -> float:
+        # Monotonic time in (game) seconds
+        pass
+
+    @abstractmethod
+    async def sleep(self, seconds: float):
+        pass
+
+
+class RealClock(Clock):
+    def now(self) -> float:
+        return time.perf_counter()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class ScaledClock(Clock):
+    """
+    Real time sped up by a constant factor, eg. ScaledClock(1000) runs a 20 second answer window in 20ms.
+    """
+    def __init__(self, factor: float):
+        if factor <= 0:
+            raise ValueError(f"Clock scale factor must be positive, got {factor}")
+        self._factor = factor
+        self._start = time.perf_counter()
+
+    def now(self) -> float:
+        return self._start + (time.perf_counter() - self._start) * self._factor
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds / self._factor)
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """
+    Selector which, rather than blocking until the next timer is due, jumps the virtual clock forward to it.
+    """
+    def __init__(self, clock: "VirtualClock"):
+        super().__init__()
+        self._virtual_clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout is None:
+            # Nothing is scheduled, so only real I/O can wake the loop up
+            return events or super().select(None)
+        if timeout > 0:
+            self._virtual_clock._advance(timeout)
+        return events
+
+
+class _VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: "VirtualClock"):
+        self._virtual_clock = clock
+        super().__init__(_VirtualSelector(clock))
+
+    def time(self) -> float:
+        return self._virtual_clock.now()
+
+
+class VirtualClock(Clock):
+    """
+    Fully virtual, event driven clock. Games must run on the clock's event loop (see run()): whenever the loop has
+    nothing ready to run, time skips straight to the next scheduled timer. A game takes exactly as many virtual
+    seconds as it would in real time, but only as much wall time as its code takes to execute.
+    """
+    def __init__(self):
+        self._now = 0.0
+        self._loop = _VirtualTimeLoop(self)
+
+    def now(self) -> float:
+        return self._now
+
+    def _advance(self, seconds: float):
+        self._now += seconds
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    async def sleep(self, seconds: float):
+        if asyncio.get_running_loop() is not self._loop:
+            raise RuntimeError("VirtualClock.sleep called outside of the clock's event loop")
+        await asyncio.sleep(seconds)
+
+    def run(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    def close(self):
+        # Like asyncio.run, cancel whatever is still pending (e.g. answers due after the window closed) before closing
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
+
+REAL_CLOCK = RealClock()
@@ -0,0 +1,96 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+from logging import Logger
+
+LOG_FORMAT = "%(asctime)s:%(levelname)s:%(name)s: %(message)s"
+# High volume event categories. Each one is a child logger of the game logger, so it can be given its own level and
+# sample rate, eg. logger "nextcord.answers"
+ANSWERS = "answers"
+GRADING = "grading"
+CATEGORIES = (ANSWERS, GRADING)
+
+
+class StructuredMessage:
+    """
+    Log message made up of an event name and key/value fields. The fields are only rendered when the record is
+    formatted, which happens on the logging thread, and handlers that want them as data can read `record.msg.fields`.
+    Field values should be immutable snapshots (ints, strs, ...), since the record may be formatted some time after
+    the call.
+    """
+    __slots__ = ("event", "fields")
+
+    def __init__(self, event: str, **fields):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self):
+        return self.event + "".join(f" {key}={value!r}" for key, value in self.fields.items())
+
+
+class SampleFilter(logging.Filter):
+    """
+    Keeps one record out of every `1 / rate`. Counter based rather than random so it's cheap and deterministic.
+    Records at WARNING or above are always kept.
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        if not 0 < rate <= 1:
+            raise ValueError(f"Sample rate must be in (0, 1], got {rate}")
+        self._every = round(1 / rate)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or next(self._counter) % self._every == 0
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler which leaves formatting to the listener thread. The stock handler formats every record in the
+    calling thread (ie. on the event loop) before queueing it.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_category_config(config: str | None) -> dict[str, str]:
+    # "answers=WARNING,grading=0.1" -> {"answers": "WARNING", "grading": "0.1"}
+    if not config:
+        return {}
+    parsed = {}
+    for item in config.split(","):
+        category, _, value = item.partition("=")
+        if category.strip() not in CATEGORIES:
+            raise ValueError(f"Unknown logging category {category!r}. Categories: {CATEGORIES}")
+        parsed[category.strip()] = value.strip()
+    return parsed
+
+
+def setup_logging(logger: Logger, filename: str, level: str | int = logging.DEBUG,
+                  category_levels: dict[str, str] | None = None,
+                  sample_rates: dict[str, str] | None = None) -> logging.handlers.QueueListener:
+    """
+    Route `logger` through an in-memory queue to a file handler running on a background thread, so the event loop
+    never blocks on formatting or disk writes.
+    :param logger: the logger to set up, normally "nextcord"
+    :param filename: the log file
+    :param level: the overall log level
+    :param category_levels: per-category log levels, eg. {"answers": "WARNING"}
+    :param sample_rates: per-category sample rates, eg. {"answers": "0.01"}
+    :return: the started listener. It is stopped at exit, flushing any queued records
+    """
+    file_handler = logging.FileHandler(filename=filename, encoding="utf-8", mode="w")
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    logger.setLevel(level)
+    logger.addHandler(_DeferredQueueHandler(log_queue))
+    for category, cat_level in (category_levels or {}).items():
+        logger.getChild(category).setLevel(cat_level.upper())
+    for category, rate in (sample_rates or {}).items():
+        logger.getChild(category).addFilter(SampleFilter(float(rate)))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
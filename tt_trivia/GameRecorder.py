@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+import enum
+import json
+import struct
+from typing import Iterator, NamedTuple
+
+from QuestionSet import Question, MCQuestion, TFQuestion, FreeQuestion, Qtype
+
+MAGIC = b"TTTR"
+VERSION = 1
+# Header: magic, version, guild id, game mode name length (followed by the name)
+_HEADER = struct.Struct("<4sBQB")
+# Event: type, seconds since the game started, user id (status value for STATUS events), payload length (followed by
+# the utf-8 payload)
+_EVENT = struct.Struct("<BdQI")
+# Buffered events are written out when the game changes status, between answer windows, once there are at least
+# IDLE_FLUSH_EVENTS of them. FLUSH_EVENTS caps the buffer if a single answer window is flooded.
+IDLE_FLUSH_EVENTS = 1000
+FLUSH_EVENTS = 100000
+
+# One writer thread for all recordings, so each log's flushes are written in order
+_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="game-recorder")
+
+_QUESTION_CLASSES = {Qtype.MULTI_CHOICE: MCQuestion, Qtype.TRUE_FALSE: TFQuestion, Qtype.FREE_RESPONSE: FreeQuestion}
+
+
+class EventType(enum.IntEnum):
+    JOIN = 1
+    ANSWER = 2
+    BUTTON = 3
+    END = 4
+    STATUS = 5
+    QUESTIONS = 6
+    OPTIONS = 7
+    DELIVERED = 8
+
+
+# Plain ints, enum member lookups are comparatively slow on the answer path
+_ANSWER = int(EventType.ANSWER)
+_BUTTON = int(EventType.BUTTON)
+
+
+class Event(NamedTuple):
+    type: EventType
+    time: float
+    user_id: int
+    payload: str
+
+
+class GameRecorder:
+    """
+    Appends every inbound game event to a compact binary log, for replaying a game offline with Replay.py.
+    Recording an event only appends a tuple to a list; packing and writing happen on a background thread.
+    """
+    _events: list[tuple[int, float, int, str]]
+    _start: float | None
+
+    def __init__(self, path: str, game_mode: str, guild_id: int):
+        self._path = path
+        mode = game_mode.encode("utf-8")
+        self._header = _HEADER.pack(MAGIC, VERSION, guild_id, len(mode)) + mode
+        self._events = []
+        self._start = None
+        self._written = False
+
+    def start(self, now: float):
+        self._start = now
+
+    def _append(self, event_type: EventType, now: float, user_id: int = 0, payload: str = ""):
+        self._events.append((event_type, now - self._start, user_id, payload))
+        if len(self._events) >= FLUSH_EVENTS:
+            self.flush()
+
+    def join(self, now: float, user_id: int, name: str):
+        self._append(EventType.JOIN, now, user_id, name)
+
+    def answer(self, now: float, user_id: int, content: str):
+        self._events.append((_ANSWER, now - self._start, user_id, content))
+        if len(self._events) >= FLUSH_EVENTS:
+            self.flush()
+
+    def button(self, now: float, user_id: int, choice: str):
+        self._events.append((_BUTTON, now - self._start, user_id, choice))
+        if len(self._events) >= FLUSH_EVENTS:
+            self.flush()
+
+    def end(self, now: float):
+        self._append(EventType.END, now)
+
+    def status(self, now: float, status: enum.Enum):
+        self._append(EventType.STATUS, now, status.value)
+        if len(self._events) >= IDLE_FLUSH_EVENTS:
+            self.flush()
+
+    def delivered(self, now: float):
+        # When a question was delivered, which answer times are measured from
+        self._append(EventType.DELIVERED, now)
+
+    def options(self, now: float, options: dict):
+        # Game settings which affect scoring, so replays can apply them
+        self._append(EventType.OPTIONS, now, 0, json.dumps(options))
+
+    def questions(self, now: float, q_type: Qtype, questions: list[Question]):
+        payload = json.dumps({"q_type": q_type.value, "questions": [q.as_dict() for q in questions]})
+        self._append(EventType.QUESTIONS, now, 0, payload)
+
+    def flush(self) -> Future:
+        events, self._events = self._events, []
+        future = _WRITER.submit(self._write, events, not self._written)
+        self._written = True
+        return future
+
+    def _write(self, events: list[tuple[int, float, int, str]], first: bool):
+        buffer = bytearray(self._header) if first else bytearray()
+        for event_type, when, user_id, payload in events:
+            data = payload.encode("utf-8")
+            buffer += _EVENT.pack(event_type, when, user_id, len(data))
+            buffer += data
+        with open(self._path, "wb" if first else "ab") as f:
+            f.write(buffer)
+
+    def close(self) -> Future:
+        # The returned future completes once the log is fully written. The writer runs one job at a time, in order,
+        # so even an empty job waits for earlier flushes
+        if self._events or not self._written:
+            return self.flush()
+        return _WRITER.submit(lambda: None)
+
+    def get_path(self) -> str:
+        return self._path
+
+
+def read_log(path: str) -> tuple[str, int, list[Event]]:
+    """
+    :return: the game mode, guild id and events of a recorded game
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, guild_id, mode_len = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} game recording")
+    offset = _HEADER.size + mode_len
+    game_mode = data[_HEADER.size: offset].decode("utf-8")
+    return game_mode, guild_id, list(_iter_events(data, offset))
+
+
+def _iter_events(data: bytes, offset: int) -> Iterator[Event]:
+    while offset < len(data):
+        event_type, when, user_id, length = _EVENT.unpack_from(data, offset)
+        offset += _EVENT.size
+        yield Event(EventType(event_type), when, user_id, data[offset: offset + length].decode("utf-8"))
+        offset += length
+
+
+def decode_questions(payload: str) -> tuple[Qtype, list[Question]]:
+    q_data = json.loads(payload)
+    q_type = Qtype(q_data["q_type"])
+    return q_type, [_QUESTION_CLASSES[q_type](**q) for q in q_data["questions"]]
@@ -0,0 +1,44 @@
+from bisect import bisect_left
+
+# Upper bounds, in seconds, of the histogram buckets. The last bucket holds everything slower
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0)
+
+
+class LatencyHistogram:
+    """
+    Fixed bucket histogram of latencies. Adding a sample is a binary search over a dozen bounds, and the memory used
+    doesn't grow with the number of samples.
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        # Upper bound of the bucket holding the pth percentile, capped at the max
+        rank = p * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank and seen > 0:
+                return min(bound, self.max)
+        return self.max
+
+    def __str__(self):
+        if not self.count:
+            return "n=0"
+        return (f"n={self.count} mean={self.mean():.2f}s p50<={self.percentile(0.5):g}s "
+                f"p90<={self.percentile(0.9):g}s max={self.max:.2f}s")
@@ -9,6 +9,8 @@ class Player:
     streak: int = 0
     perfect: bool = True
     answer: str | None = None
+    # Seconds from the question being delivered to the answer arriving
+    answer_time: float | None = None
 
     def __repr__(self):
         r = f"Player: id= {self.id}: name= {self.name}"
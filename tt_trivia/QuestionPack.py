@@ -0,0 +1,221 @@
+import csv
+import itertools
+import json
+import logging
+import mmap
+import os
+import random
+from array import array
+from bisect import bisect_right
+
+from Categories import MAX_QUESTIONS
+from QuestionSet import QuestionProvider, Qtype, Question, ApiError, make_question
+
+# Category of games that don't name one, any category in the pack
+ANY_CATEGORY = "any"
+INDEX_SUFFIX = ".idx"
+# Bumped when the rules for which lines get indexed change, so old indexes are rebuilt
+INDEX_VERSION = 2
+# Multiple choice questions need exactly this many incorrect answers, there are only four buttons
+NUM_INCORRECT = 3
+# opentdb's question types. Multiple choice and free response games both use "multiple" questions
+_KINDS = {Qtype.MULTI_CHOICE: "multiple", Qtype.FREE_RESPONSE: "multiple", Qtype.TRUE_FALSE: "boolean"}
+_INCORRECT_COLUMN = "incorrect_answer"
+
+logger = logging.getLogger("nextcord.questions")
+
+
+class QuestionPack(QuestionProvider):
+    """
+    Questions from a local pack file, JSONL or CSV, with one question per line. Fields are opentdb's, in plain text:
+    category, difficulty, type ("multiple" or "boolean", default "multiple"), question, correct_answer and the
+    incorrect answers (a list in JSONL, columns starting "incorrect_answer" in CSV). Multiple choice questions need
+    exactly three incorrect answers and true or false ones an answer of "True" or "False"; lines that don't parse or
+    are missing a field are skipped when the index is built.
+
+    The pack is memory mapped rather than read. The only thing held in memory is an index of the byte offset of every
+    question, grouped by category, difficulty and type; it's built on first load and saved next to the pack. Drawing
+    questions picks offsets at random and decodes just those lines.
+    """
+    default_category = ANY_CATEGORY
+    _offsets: dict[tuple[str, str, str], array]
+
+    def __init__(self, path: str):
+        self._path = path
+        self._is_csv = path.lower().endswith(".csv")
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.close()
+            raise ValueError(f"Question pack {path} is empty")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Column numbers of the CSV fields, and where the questions start
+        self._columns: dict[str, int] = {}
+        self._incorrect_columns: list[int] = []
+        self._data_start = self._read_header() if self._is_csv else 0
+        self._offsets = self._load_index()
+        if self._offsets is None:
+            self._offsets = self._build_index()
+            self._save_index()
+        self._names = sorted({category for category, _, _ in self._offsets})
+        # (offset arrays, running totals of their lengths) for each category, difficulty and type asked for
+        self._selections: dict[tuple[str, str, str], tuple[list[array], list[int]]] = {}
+
+    def __len__(self):
+        return sum(len(offsets) for offsets in self._offsets.values())
+
+    def __contains__(self, category: str) -> bool:
+        return category == ANY_CATEGORY or category in self._names
+
+    def names(self) -> list[str]:
+        return [ANY_CATEGORY] + self._names
+
+    def cap(self, q_type: Qtype, category: str, difficulty: str, num: int) -> int:
+        return min(num, MAX_QUESTIONS, self.available(q_type, category, difficulty))
+
+    def available(self, q_type: Qtype, category: str, difficulty: str) -> int:
+        totals = self._select(category, difficulty, _KINDS[q_type])[1]
+        return totals[-1] if totals else 0
+
+    async def fetch(self, q_type: Qtype, category: str, difficulty: str, amount: int) -> list[Question]:
+        return self.draw(q_type, category, difficulty, amount)
+
+    def draw(self, q_type: Qtype, category: str, difficulty: str, amount: int) -> list[Question]:
+        offsets, totals = self._select(category, difficulty, _KINDS[q_type])
+        total = totals[-1] if totals else 0
+        if amount > total:
+            raise ApiError(f"Question pack has {total} {category} {difficulty} questions, {amount} were asked for")
+        questions = []
+        # Sampling from a range doesn't build the range, so this costs the same however big the pack is
+        for i in random.sample(range(total), amount):
+            group = bisect_right(totals, i)
+            offset = offsets[group][i - (totals[group - 1] if group else 0)]
+            questions.append(self._decode(offset, q_type))
+        return questions
+
+    def _select(self, category: str, difficulty: str, kind: str) -> tuple[list[array], list[int]]:
+        selection = self._selections.get((category, difficulty, kind))
+        if selection is None:
+            offsets = [offsets for (cat, diff, q_kind), offsets in self._offsets.items()
+                       if (category == ANY_CATEGORY or cat == category) and (difficulty == "any" or diff == difficulty)
+                       and q_kind == kind]
+            selection = self._selections[(category, difficulty, kind)] = \
+                (offsets, list(itertools.accumulate(map(len, offsets))))
+        return selection
+
+    # Reading questions
+    def _line(self, offset: int) -> bytes:
+        end = self._map.find(b"\n", offset)
+        return self._map[offset: end if end != -1 else len(self._map)]
+
+    def _parse(self, line: bytes) -> dict:
+        if not self._is_csv:
+            return json.loads(line)
+        row = next(csv.reader([line.rstrip(b"\r").decode("utf-8")]))
+        record = {name: row[column] for name, column in self._columns.items() if column < len(row)}
+        record["incorrect_answers"] = [row[column] for column in self._incorrect_columns
+                                       if column < len(row) and row[column]]
+        return record
+
+    def _decode(self, offset: int, q_type: Qtype) -> Question:
+        record = self._parse(self._line(offset))
+        return make_question(q_type, record["category"], record["difficulty"], record["question"],
+                             str(record["correct_answer"]), [str(ans) for ans in record.get("incorrect_answers", ())])
+
+    def _read_header(self) -> int:
+        header = self._line(0)
+        for column, name in enumerate(next(csv.reader([header.rstrip(b"\r").decode("utf-8-sig")]))):
+            name = name.strip().lower()
+            if name.startswith(_INCORRECT_COLUMN):
+                self._incorrect_columns.append(column)
+            else:
+                self._columns[name] = column
+        missing = {"category", "difficulty", "question", "correct_answer"} - self._columns.keys()
+        if missing:
+            raise ValueError(f"Question pack {self._path} has no {', '.join(sorted(missing))} column")
+        return len(header) + 1
+
+    # Index
+    def _build_index(self) -> dict[tuple[str, str, str], array]:
+        # Offsets fit in 4 bytes unless the pack is over 4GiB
+        typecode = "I" if len(self._map) < 2 ** 32 else "Q"
+        offsets: dict[tuple[str, str, str], array] = {}
+        skipped = 0
+        offset = self._data_start
+        size = len(self._map)
+        while offset < size:
+            line = self._line(offset)
+            if line.strip():
+                try:
+                    key = self._index_key(self._parse(line))
+                except (ValueError, KeyError, TypeError, AttributeError, StopIteration):
+                    skipped += 1
+                else:
+                    if key not in offsets:
+                        offsets[key] = array(typecode)
+                    offsets[key].append(offset)
+            offset += len(line) + 1
+        if skipped:
+            logger.warning("Skipped %s malformed questions in %s", skipped, self._path)
+        return offsets
+
+    @staticmethod
+    def _index_key(record: dict) -> tuple[str, str, str]:
+        """
+        Checks a record has everything _decode needs, so a question that's drawn can always be asked.
+        :return: the record's category, difficulty and type
+        :raises ValueError: if the record can't be made into a question
+        """
+        kind = (record.get("type") or "multiple").strip().lower()
+        category, difficulty, question = record["category"], record["difficulty"], record["question"]
+        answer, incorrect = record["correct_answer"], record.get("incorrect_answers", [])
+        if not all(isinstance(field, str) and field.strip() for field in (category, difficulty, question)):
+            raise ValueError("Question, category and difficulty must be non-empty strings")
+        if not isinstance(incorrect, list) or not all(isinstance(ans, str) for ans in incorrect):
+            raise ValueError("Incorrect answers must be a list of strings")
+        if kind == "multiple":
+            if not isinstance(answer, str) or not answer.strip() or len(incorrect) != NUM_INCORRECT:
+                raise ValueError(f"Multiple choice questions need an answer and {NUM_INCORRECT} incorrect answers")
+        elif kind == "boolean":
+            if str(answer).lower() not in ("true", "false"):
+                raise ValueError("True or false questions need an answer of True or False")
+        else:
+            raise ValueError(f"Unknown question type {kind!r}")
+        return category.strip().lower(), difficulty.strip().lower(), kind
+
+    def _index_header(self) -> dict:
+        stat = os.fstat(self._file.fileno())
+        return {"version": INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _save_index(self):
+        # A header line, then each group's offsets as raw bytes
+        header = self._index_header()
+        header["groups"] = [[*key, offsets.typecode, len(offsets)] for key, offsets in self._offsets.items()]
+        tmp_file = self._path + INDEX_SUFFIX + ".tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                for offsets in self._offsets.values():
+                    offsets.tofile(f)
+            os.replace(tmp_file, self._path + INDEX_SUFFIX)
+        except OSError as err:
+            # Only costs a rebuild on the next start
+            logger.warning("Failed to save question pack index for %s: %r", self._path, err)
+
+    def _load_index(self) -> dict[tuple[str, str, str], array] | None:
+        # The saved index, if there is one and the pack hasn't changed since it was built
+        try:
+            with open(self._path + INDEX_SUFFIX, "rb") as f:
+                header = json.loads(f.readline())
+                if any(header.get(name) != value for name, value in self._index_header().items()):
+                    return None
+                offsets = {}
+                for category, difficulty, kind, typecode, count in header["groups"]:
+                    group = offsets[(category, difficulty, kind)] = array(typecode)
+                    group.fromfile(f, count)
+                return offsets
+        except (OSError, ValueError, KeyError, EOFError):
+            return None
+
+    def close(self):
+        self._map.close()
+        self._file.close()
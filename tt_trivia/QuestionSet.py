@@ -1,16 +1,28 @@
-import json
 # import aiohttp
 import requests
 import base64
+import binascii
 import asyncio
-from dataclasses import dataclass
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass, asdict
 import enum
+import functools
+import itertools
+import logging
 import random
 import time
+from SeenIndex import SeenIndex
+from Categories import CATEGORIES
 
 random.seed(time.time())
+# Child of the bot's logger, so it goes through the same queued handler
+logger = logging.getLogger("nextcord.questions")
 API_BASE_URL = "https://opentdb.com/api.php?"
 DIFFICULTIES = {"easy", "medium", "hard", "any"}
+# opentdb allows one question request per IP every 5 seconds, and answers any faster one with response code 5
+REQUEST_INTERVAL = 5
+RATE_LIMITED = 5
 
 
 class Qtype(enum.Enum):
@@ -24,18 +36,36 @@ class ApiError(RuntimeError):
         super().__init__(message)
 
 
+class NoQuestionsError(ValueError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class RateLimitedError(RuntimeError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
 class QuestionSet:
     def __init__(self, q_type: Qtype = Qtype.MULTI_CHOICE, **kwargs):
+        # Where the questions come from, opentdb unless a question pack is given
+        provider = kwargs["provider"] if "provider" in kwargs else None
+        if provider is None:
+            provider = OpenTDBProvider()
         # keyword args set to default if need be
-        category = kwargs["category"] if "category" in kwargs else "general knowledge"
+        category = kwargs["category"] if "category" in kwargs else provider.default_category
         difficulty = kwargs["difficulty"] if "difficulty" in kwargs else "any"
         num = kwargs["num"] if "num" in kwargs else 20
-        with open("../resource/categories.json", "r") as f:
-            self._categories = json.load(f)
+        # Optional index of the questions this guild has already seen, so they aren't repeated across games
+        seen = kwargs["seen"] if "seen" in kwargs else None
         assert 0 < num < 51
-        assert category in self._categories.keys()
+        assert category in provider
         assert difficulty in DIFFICULTIES
         assert isinstance(q_type, Qtype)
+        # Don't ask for more questions than the provider has, the request would fail outright
+        num = provider.cap(q_type, category, difficulty.lower(), num)
+        if num < 1:
+            raise NoQuestionsError(f"There are no {difficulty.lower()} questions in the {category} category")
         self._index = 0
         self._questions = []
         self._q_type = q_type
@@ -43,7 +73,8 @@ class QuestionSet:
         self._difficulty = difficulty.lower()
         self._num = num
         self._initialized = False
-        self._session = None
+        self._provider: QuestionProvider = provider
+        self._seen: SeenIndex | None = seen
 
     def get_q_type(self):
         return self._q_type
@@ -65,22 +96,171 @@ class QuestionSet:
 
     async def initialize(self):
         self._index = 0
-        request_url = API_BASE_URL + f"amount={self._num}"
+        if self._seen is None:
+            self._questions = await self._fetch_questions(self._num)
+        else:
+            self._questions = await self._fetch_unseen_questions()
+        self._initialized = True
+
+    async def _fetch_questions(self, amount: int) -> list["Question"]:
+        return await self._provider.fetch(self._q_type, self._category, self._difficulty, amount)
+
+    async def _fetch_unseen_questions(self) -> list["Question"]:
+        # One request, over-fetched based on how many repeats previous fetches turned up, then the questions already
+        # seen are dropped. opentdb only takes a request every few seconds, so repeats are settled for rather than
+        # asking again
+        amount = self._provider.cap(self._q_type, self._category, self._difficulty, self._seen.fetch_size(self._num))
+        try:
+            questions = await self._fetch_questions(amount)
+        except ApiError:
+            # The session has fewer questions left than asked for, try for just the ones the game needs
+            if amount <= self._num:
+                raise
+            questions = await self._fetch_questions(self._num)
+        fresh, repeats = [], []
+        for question in questions:
+            (repeats if question.question in self._seen else fresh).append(question)
+        self._seen.record_fetch(len(questions), len(repeats))
+        logger.debug("Fetched %s unseen questions. Repeat rate: %.0f%%", len(fresh), 100 * self._seen.get_repeat_rate())
+        # Better to repeat a few questions than to come up short
+        return (fresh + repeats)[:self._num]
+
+    def is_initialized(self):
+        return self._initialized
+
+    def get_questions(self) -> list["Question"]:
+        return self._questions
+
+    def load(self, questions: list["Question"]):
+        # Use an already constructed list of questions, eg. from a game recording, rather than fetching them
+        self._questions = questions
+        self._num = len(questions)
+        self._index = 0
+        self._initialized = True
+
+    def __repr__(self):
+        rep = f"Category:\t{self._category}"
+        rep += f"\nQuestion type:\t{self._q_type}"
+        rep += f"\nDifficulty:\t{self._difficulty}"
+        rep += f"\nNo. Questions:\t{self._num}"
+        rep += f"\nInitialized:\t{self._initialized}"
+        rep += f"Questions:\n\n"
+        for question in self._questions:
+            rep += f"\t- {question}\n"
+        return rep
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __iter__(self):
+        if not self._initialized:
+            raise RuntimeError(f"Call to __iter__ on QuestionSet {self} before it was initialized")
+        self._index = 0
+        return self
+
+    def __next__(self):
+        if not self._initialized:
+            raise RuntimeError(f"Call to __next__ on QuestionSet {self} before it was initialized.")
+        if self._index < self._num:
+            next_q = self._questions[self._index]
+            self._index += 1
+            if self._seen is not None:
+                self._seen.add(next_q.question)
+            return next_q
+        else:
+            raise StopIteration
+
+
+class QuestionProvider(ABC):
+    """
+    Where a QuestionSet gets its questions: opentdb, or a local question pack. Providers also say which categories
+    they have, and how many questions, so start commands can be checked up front.
+    """
+    # Category of games whose start command doesn't name one
+    default_category: str
+
+    @abstractmethod
+    def __contains__(self, category: str) -> bool:
+        pass
+
+    @abstractmethod
+    def names(self) -> list[str]:
+        pass
+
+    @abstractmethod
+    def cap(self, q_type: Qtype, category: str, difficulty: str, num: int) -> int:
+        """
+        :return: num, capped to the number of questions available for the category and difficulty
+        """
+        pass
+
+    @abstractmethod
+    async def fetch(self, q_type: Qtype, category: str, difficulty: str, amount: int) -> list["Question"]:
+        """
+        :raises ApiError: if there aren't `amount` questions to give
+        """
+        pass
+
+
+class OpenTDBProvider(QuestionProvider):
+    """
+    Questions from the opentdb api. Each provider has its own session token, which keeps opentdb from sending the
+    same question twice, so QuestionSets make their own.
+    """
+    default_category = "general knowledge"
+    # When the next question request may be sent. Shared by every provider, opentdb's limit is per IP
+    _next_request = 0.0
+
+    def __init__(self):
+        self._session = None
+
+    def __contains__(self, category: str) -> bool:
+        return category in CATEGORIES
+
+    def names(self) -> list[str]:
+        return CATEGORIES.names()
+
+    def cap(self, q_type: Qtype, category: str, difficulty: str, num: int) -> int:
+        # opentdb's counts don't split by question type
+        return CATEGORIES.cap(category, difficulty, num)
+
+    async def fetch(self, q_type: Qtype, category: str, difficulty: str, amount: int) -> list["Question"]:
+        url = self._request_url(q_type, category, difficulty, amount)
+        await self._wait_turn()
+        try:
+            return self._fetch_questions(url, q_type)
+        except RateLimitedError:
+            # Another client on this IP got in first, one more try after the interval
+            logger.info("opentdb rate limited a question request, retrying in %ss", REQUEST_INTERVAL)
+            await self._wait_turn()
+            return self._fetch_questions(url, q_type)
+
+    @classmethod
+    async def _wait_turn(cls):
+        # Reserve the next request slot before sleeping, so concurrent fetches queue up behind each other
+        now = time.monotonic()
+        wait = cls._next_request - now
+        cls._next_request = max(cls._next_request, now) + REQUEST_INTERVAL
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def _request_url(q_type: Qtype, category: str, difficulty: str, amount: int) -> str:
+        request_url = API_BASE_URL + f"amount={amount}"
         request_url += "&encode=base64"
-        if self._category != "":
-            cat_id = self._categories[self._category]
+        if category != "":
+            cat_id = CATEGORIES.id_of(category)
             request_url += f"&category={cat_id}"
-        if self._difficulty != "any":
-            request_url += f"&difficulty={self._difficulty}"
-        if self._q_type == Qtype.MULTI_CHOICE or self._q_type == Qtype.FREE_RESPONSE:
+        if difficulty != "any":
+            request_url += f"&difficulty={difficulty}"
+        if q_type == Qtype.MULTI_CHOICE or q_type == Qtype.FREE_RESPONSE:
             request_url += "&type=multiple"
-        elif self._q_type == Qtype.TRUE_FALSE:
+        elif q_type == Qtype.TRUE_FALSE:
             request_url += "&type=boolean"
         print(f"Request URL: {request_url}")
-        await self._fetch_questions(request_url)
-        self._initialized = True
+        return request_url
 
-    async def _fetch_questions(self, url):
+    def _fetch_questions(self, url: str, q_type: Qtype) -> list["Question"]:
         # TODO: replace requests with aiohttp asyc http request
         if self._session is None:
             with requests.request("GET", "https://opentdb.com/api_token.php?command=request") as response:
@@ -106,65 +286,49 @@ class QuestionSet:
             elif q_data["response_code"] in {1, 4}:
                 print("API Request failed due to running out of questions")
                 raise ApiError(f"API does not have enough questions to service request: {url}")
+            elif q_data["response_code"] == RATE_LIMITED:
+                raise RateLimitedError(f"opentdb rate limited the request: {url}")
             elif q_data["response_code"] != 0:
                 print("API Request failed")
-                raise RuntimeError(f"Get request for questions failed. {q_data['response code']=}")
+                raise RuntimeError(f"Get request for questions failed. {q_data['response_code']=}")
             question_lst = q_data["results"]
-            self._questions = [self._construct_question(q_dict) for q_dict in question_lst]
+            return self.construct_questions(question_lst, q_type)
 
-    def _construct_question(self, question_dict):
+    @staticmethod
+    def construct_questions(question_dicts: list[dict], q_type: Qtype) -> list["Question"]:
+        # Multiple choice and free response questions are packed into one shared buffer and decoded lazily
+        if q_type == Qtype.MULTI_CHOICE or q_type == Qtype.FREE_RESPONSE:
+            return QuestionBatch(question_dicts, q_type).questions()
+        return [OpenTDBProvider.construct_question(q_dict, q_type) for q_dict in question_dicts]
+
+    @staticmethod
+    def construct_question(question_dict: dict, q_type: Qtype) -> "Question":
         # Question, answers, etc are base64 encoded, so decode them
         def decode(s): return str(base64.urlsafe_b64decode(s), "utf-8")
         diff = decode(question_dict["difficulty"])
         question = decode(question_dict["question"])
         cat = decode(question_dict["category"])
         answer = decode(question_dict["correct_answer"])
-        if self._q_type == Qtype.TRUE_FALSE:
+        if q_type == Qtype.TRUE_FALSE:
             return TFQuestion(cat=cat, diff=diff, question=question, answer=bool(answer))
-        elif self._q_type == Qtype.MULTI_CHOICE:
-            choices = [decode(ans) for ans in question_dict["incorrect_answers"]]
-            choices.append(answer)  # answer already decoded
-            random.shuffle(choices)
-            ans_idx = choices.index(answer)
-            return MCQuestion(cat=cat, diff=diff, question=question, answer=answer,
-                              choices=choices, answer_index=ans_idx)
-        elif self._q_type == Qtype.FREE_RESPONSE:
-            return FreeQuestion(cat=cat, diff=diff, question=question, answer=answer)
-        else:
-            raise ValueError(f"Unknown question type {self._q_type}")
-
-    def is_initialized(self):
-        return self._initialized
-
-    def __repr__(self):
-        rep = f"Category:\t{self._category}"
-        rep += f"\nQuestion type:\t{self._q_type}"
-        rep += f"\nDifficulty:\t{self._difficulty}"
-        rep += f"\nNo. Questions:\t{self._num}"
-        rep += f"\nInitialized:\t{self._initialized}"
-        rep += f"Questions:\n\n"
-        for question in self._questions:
-            rep += f"\t- {question}\n"
-        return rep
-
-    def __str__(self):
-        return self.__repr__()
-
-    def __iter__(self):
-        if not self._initialized:
-            raise RuntimeError(f"Call to __iter__ on QuestionSet {self} before it was initialized")
-        self._index = 0
-        return self
-
-    def __next__(self):
-        if not self._initialized:
-            raise RuntimeError(f"Call to __next__ on QuestionSet {self} before it was initialized.")
-        if self._index < self._num:
-            next_q = self._questions[self._index]
-            self._index += 1
-            return next_q
-        else:
-            raise StopIteration
+        incorrect = [decode(ans) for ans in question_dict["incorrect_answers"]] if q_type == Qtype.MULTI_CHOICE else []
+        return make_question(q_type, cat, diff, question, answer, incorrect)
+
+
+def make_question(q_type: Qtype, cat: str, diff: str, question: str, answer: str,
+                  incorrect: list[str]) -> "Question":
+    if q_type == Qtype.TRUE_FALSE:
+        return TFQuestion(cat=cat, diff=diff, question=question, answer=answer.lower() == "true")
+    elif q_type == Qtype.MULTI_CHOICE:
+        choices = incorrect + [answer]
+        random.shuffle(choices)
+        ans_idx = choices.index(answer)
+        return MCQuestion(cat=cat, diff=diff, question=question, answer=answer,
+                          choices=choices, answer_index=ans_idx)
+    elif q_type == Qtype.FREE_RESPONSE:
+        return FreeQuestion(cat=cat, diff=diff, question=question, answer=answer)
+    else:
+        raise ValueError(f"Unknown question type {q_type}")
 
 
 @dataclass
@@ -174,6 +338,9 @@ class Question:
     question: str
     answer: bool | str
 
+    def as_dict(self) -> dict:
+        return asdict(self)
+
 
 @dataclass
 class MCQuestion(Question):
@@ -209,6 +376,125 @@ class FreeQuestion(Question):
         return Qtype.FREE_RESPONSE
 
 
+# Categories and difficulties only take a handful of values, so packed questions store a small id for them. The ids
+# are keyed by the still base64 encoded name, so nothing needs decoding to look one up.
+_INTERNED_NAMES: list[str] = []
+_INTERNED_IDS: dict[str, int] = {}
+# Translates url safe base64 to the standard alphabet
+_URLSAFE_TO_STD = bytes.maketrans(b"-_", b"+/")
+
+
+def _intern(encoded: str) -> int:
+    interned_id = _INTERNED_IDS.get(encoded)
+    if interned_id is None:
+        interned_id = _INTERNED_IDS[encoded] = len(_INTERNED_NAMES)
+        _INTERNED_NAMES.append(str(base64.urlsafe_b64decode(encoded), "utf-8"))
+    return interned_id
+
+
+@functools.lru_cache(maxsize=None)
+def _permutations(n: int) -> list[tuple[int, ...]]:
+    # Shared permutation tuples, so a shuffled question only holds a reference to one
+    return list(itertools.permutations(range(n)))
+
+
+class QuestionBatch:
+    """
+    The raw base64 fields of a batch of questions, concatenated into one buffer with an array of offsets. Building
+    a batch decodes nothing; each field is decoded straight out of the buffer the first time it's read.
+    """
+    __slots__ = ("_buffer", "_offsets", "_questions")
+
+    def __init__(self, question_dicts: list[dict], q_type: Qtype):
+        fields = []
+        questions = []
+        for q_dict in question_dicts:
+            incorrect = q_dict["incorrect_answers"] if q_type == Qtype.MULTI_CHOICE else ()
+            questions.append(PackedQuestion(self, len(fields), len(incorrect) + 1 if incorrect else 0,
+                                            _intern(q_dict["category"]), _intern(q_dict["difficulty"])))
+            fields.append(q_dict["question"])
+            fields.append(q_dict["correct_answer"])
+            fields.extend(incorrect)
+        self._buffer = memoryview("".join(fields).encode("ascii").translate(_URLSAFE_TO_STD))
+        self._offsets = array("I", itertools.accumulate(map(len, fields), initial=0))
+        self._questions = questions
+
+    def questions(self) -> list["PackedQuestion"]:
+        return self._questions
+
+    def decode(self, field: int) -> str:
+        return binascii.a2b_base64(self._buffer[self._offsets[field]: self._offsets[field + 1]]).decode("utf-8")
+
+
+class PackedQuestion:
+    """
+    Compact stand-in for MCQuestion and FreeQuestion. Fields are decoded from the batch's buffer on first access and
+    then cached. Choices are shuffled by picking a permutation rather than storing a shuffled list.
+    """
+    __slots__ = ("_batch", "_field", "_num_choices", "_cat_id", "_diff_id", "_order", "_question", "_answer",
+                 "_choices")
+
+    def __init__(self, batch: QuestionBatch, field: int, num_choices: int, cat_id: int, diff_id: int):
+        self._batch = batch
+        # Fields from here on are: question, correct answer, incorrect answers
+        self._field = field
+        self._num_choices = num_choices
+        self._cat_id = cat_id
+        self._diff_id = diff_id
+        self._order = random.choice(_permutations(num_choices)) if num_choices else ()
+        self._question = None
+        self._answer = None
+        self._choices = None
+
+    @property
+    def cat(self) -> str:
+        return _INTERNED_NAMES[self._cat_id]
+
+    @property
+    def diff(self) -> str:
+        return _INTERNED_NAMES[self._diff_id]
+
+    @property
+    def question(self) -> str:
+        if self._question is None:
+            self._question = self._batch.decode(self._field)
+        return self._question
+
+    @property
+    def answer(self) -> str:
+        if self._answer is None:
+            self._answer = self._batch.decode(self._field + 1)
+        return self._answer
+
+    @property
+    def choices(self) -> list[str]:
+        if self._choices is None:
+            # Choice 0 is the correct answer, so reuse it if it's already decoded
+            self._choices = [self.answer if i == 0 else self._batch.decode(self._field + 1 + i) for i in self._order]
+        return self._choices
+
+    @property
+    def answer_index(self) -> int:
+        return self._order.index(0)
+
+    def get_q_type(self) -> Qtype:
+        return Qtype.MULTI_CHOICE if self._num_choices else Qtype.FREE_RESPONSE
+
+    @staticmethod
+    def get_index(char):
+        return "abcd".index(char)
+
+    def as_dict(self) -> dict:
+        q_dict = {"cat": self.cat, "diff": self.diff, "question": self.question, "answer": self.answer}
+        if self._num_choices:
+            q_dict["choices"] = self.choices
+            q_dict["answer_index"] = self.answer_index
+        return q_dict
+
+    def __repr__(self):
+        return f"PackedQuestion({', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())})"
+
+
 async def main():
     questions = QuestionSet()
     # async with aiohttp.ClientSession() as session:
@@ -0,0 +1,191 @@
+"""
+Replays a game recorded by GameRecorder back through the game engine, offline.
+
+Usage (from the tt_trivia directory):
+    python Replay.py LOG [--realtime] [--repeat N]
+
+By default the replay runs on a virtual clock, as fast as possible. Inbound events are re-timed against the game's
+status changes, so slow sends in the original game don't push answers into the wrong answer window.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+from FFAGame import GameStatus, FFAGame
+from FFAMultiChoice import FFAMultiChoice
+from FFALives import FFALives
+from FFAFreeResponse import FFAFreeResponse
+from GameClock import Clock, RealClock, VirtualClock
+from GameRecorder import GameRecorder, EventType, Event, read_log, decode_questions
+from QuestionSet import QuestionSet, Question, Qtype
+
+GAME_MODES = {cls.__name__: cls for cls in (FFAMultiChoice, FFALives, FFAFreeResponse)}
+
+
+class _ReplayBot:
+    """Stand-in for TriviaBot, all output is discarded."""
+    def __init__(self):
+        self.finished = asyncio.Event()
+
+    async def say(self, channel_id, msg, sound_file=None, view=None):
+        pass
+
+    async def speak(self, channel_id, announcements):
+        pass
+
+    def stop_sound(self, channel_id, sound_file):
+        pass
+
+    def cleanup_game(self, game):
+        self.finished.set()
+
+
+class _RecordedQuestionSet(QuestionSet):
+    """Serves up the recorded question sets, in order, in place of fetching from opentdb."""
+    def __init__(self, q_type: Qtype, q_sets: list[list[Question]]):
+        super().__init__(q_type)
+        self._recorded = list(q_sets)
+
+    async def initialize(self):
+        if not self._recorded:
+            raise RuntimeError("Replay diverged from the recording, it has no more question sets")
+        self.load(self._recorded.pop(0))
+
+
+class _StatusObserver(GameRecorder):
+    """Recorder attached to the replayed game, which only notes when the game changes status."""
+    def __init__(self, game_mode: str, guild_id: int):
+        super().__init__(os.devnull, game_mode, guild_id)
+        self._times = []
+        self._changed = asyncio.Event()
+
+    def _append(self, event_type: EventType, now: float, user_id: int = 0, payload: str = ""):
+        pass
+
+    def status(self, now: float, status: GameStatus):
+        self._times.append(now)
+        self._changed.set()
+
+    async def wait_for(self, transition: int) -> float:
+        # Time at which the game made its nth status change
+        while len(self._times) < transition:
+            self._changed.clear()
+            await self._changed.wait()
+        return self._times[transition - 1]
+
+    def flush(self):
+        self._events.clear()
+
+    def close(self):
+        pass
+
+
+async def _drive(game: FFAGame, events: list[Event], observer: _StatusObserver, clock: Clock):
+    # The replayed game's time is the recorded time plus an offset, re-synced at every status change
+    offset = clock.now()
+    transitions = 0
+    delivered = None
+    for event in events:
+        if event.type == EventType.STATUS:
+            transitions += 1
+            offset = await observer.wait_for(transitions) - event.time
+            if delivered is not None:
+                # Sends return instantly in a replay, so the question would look delivered later than it was, relative
+                # to the answers. Put it back where it was in the recording, relative to the answer window opening
+                game._question_delivered = delivered + offset
+                delivered = None
+            continue
+        if event.type == EventType.DELIVERED:
+            delivered = event.time
+            continue
+        if event.type == EventType.QUESTIONS or event.type == EventType.OPTIONS:
+            continue
+        delay = event.time + offset - clock.now()
+        if delay > 0:
+            await clock.sleep(delay)
+        user = SimpleNamespace(id=event.user_id, name=event.payload)
+        # Discord's timestamps aren't recorded, answer times come from the game clock
+        # Mirror the checks TriviaBot makes before handing messages to a game
+        if event.type == EventType.JOIN and game.get_state() == GameStatus.GETTING_PLAYERS:
+            game.add_player(user)
+        elif event.type == EventType.ANSWER and game.get_state() == GameStatus.WAIT_ANSWERS:
+            game.receive_answer(SimpleNamespace(content=event.payload, author=user, created_at=None))
+        elif event.type == EventType.BUTTON and game.get_state() == GameStatus.WAIT_ANSWERS:
+            game.receive_button_answer(event.payload, SimpleNamespace(user=user, created_at=None))
+        elif event.type == EventType.END:
+            await game.end()
+
+
+async def _replay(game_mode: str, guild_id: int, events: list[Event], clock: Clock) -> FFAGame:
+    bot = _ReplayBot()
+    game = GAME_MODES[game_mode]({}, guild_id, bot, logging.getLogger("replay"), clock)
+    q_sets = [decode_questions(event.payload) for event in events if event.type == EventType.QUESTIONS]
+    game._questions = _RecordedQuestionSet(q_sets[0][0], [questions for _, questions in q_sets])
+    for event in events:
+        if event.type == EventType.OPTIONS:
+            options = json.loads(event.payload)
+            game.set_speed_scoring(options.get("speed_scoring", False))
+            # Recordings from before early close always waited out the full answer window
+            game.set_early_close(options.get("early_close", False))
+    observer = _StatusObserver(game_mode, guild_id)
+    game.set_recorder(observer)
+    driver = asyncio.create_task(_drive(game, events, observer, clock))
+    try:
+        await game.start()
+    except asyncio.CancelledError:
+        # Stopping a game cancels its own task stack
+        pass
+    await bot.finished.wait()
+    driver.cancel()
+    return game
+
+
+def replay(path: str, realtime: bool = False) -> FFAGame:
+    """
+    Replay a recorded game, either as fast as possible on a virtual clock or at the recorded speed.
+    :return: the finished game
+    :raises ValueError: if the file isn't a recording, or the game ended before it had any questions to replay
+    """
+    game_mode, guild_id, events = read_log(path)
+    if not any(event.type == EventType.QUESTIONS for event in events):
+        # eg. the game failed or was stopped before its questions were fetched
+        raise ValueError(f"{path} has no questions, the recorded game never got past its lobby")
+    if realtime:
+        return asyncio.run(_replay(game_mode, guild_id, events, RealClock()))
+    clock = VirtualClock()
+    try:
+        return clock.run(_replay(game_mode, guild_id, events, clock))
+    finally:
+        clock.close()
+
+
+def game_digest(game: FFAGame) -> str:
+    # Fingerprint of the final scores, for checking that replays are deterministic
+    players = sorted((p.id, p.score, p.streak, p.perfect) for p in game._players.values())
+    return hashlib.sha1(repr(players).encode("utf-8")).hexdigest()[:12]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="game recording to replay")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded speed")
+    parser.add_argument("--repeat", type=int, default=1, help="replay this many times and report replays per second")
+    args = parser.parse_args()
+    logging.getLogger("replay").setLevel(logging.WARNING)
+    start = time.perf_counter()
+    try:
+        digests = {game_digest(replay(args.log, args.realtime)) for _ in range(args.repeat)}
+    except ValueError as err:
+        parser.exit(1, f"Can't replay {args.log}: {err}\n")
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {args.log} {args.repeat} time(s) in {elapsed:.3f}s ({args.repeat / elapsed:,.1f} replays/s)")
+    print(f"Final score digest: {', '.join(digests)}" + ("" if len(digests) == 1 else " (NOT DETERMINISTIC)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+MAGIC = b"TTTS"
+# 2^17 bits (16 KiB) with 7 hashes holds about 13,000 questions at a 1% false positive rate, which is more than
+# opentdb has in total
+NUM_BITS = 1 << 17
+NUM_HASHES = 7
+# Header: magic, number of bits, number of hashes, questions added, measured repeat rate
+_HEADER = struct.Struct("<4sIIId")
+# Weight of the latest fetch in the repeat rate's moving average
+REPEAT_RATE_WEIGHT = 0.3
+MAX_FETCH = 50
+
+
+class SeenIndex:
+    """
+    Fixed size Bloom filter of the questions a guild has already been asked, kept in a memory mapped file so it
+    survives restarts. Membership checks and inserts are O(1) and the file never grows; once the filter holds more
+    questions than it was sized for, it starts over rather than letting the false positive rate climb.
+    """
+    def __init__(self, path: str, num_bits: int = NUM_BITS, num_hashes: int = NUM_HASHES):
+        size = _HEADER.size + num_bits // 8
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            with open(path, "wb") as f:
+                f.write(_HEADER.pack(MAGIC, num_bits, num_hashes, 0, 0.0))
+                f.truncate(size)
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        magic, self._num_bits, self._num_hashes, self._count, self._repeat_rate = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC or self._num_bits != num_bits or self._num_hashes != num_hashes:
+            raise ValueError(f"{path} is not a seen question index with {num_bits} bits and {num_hashes} hashes")
+        # Optimal number of entries for this many bits and hashes
+        self._capacity = int(num_bits * math.log(2) / num_hashes)
+
+    def _positions(self, question: str) -> list[int]:
+        # Double hashing: the k bit positions are derived from two halves of one digest
+        digest = hashlib.blake2b(question.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        return [(h1 + i * h2) % self._num_bits for i in range(self._num_hashes)]
+
+    def __contains__(self, question: str) -> bool:
+        mm = self._mm
+        offset = _HEADER.size
+        return all(mm[offset + (pos >> 3)] & (1 << (pos & 7)) for pos in self._positions(question))
+
+    def add(self, question: str):
+        if question in self:
+            return
+        if self._count >= self._capacity:
+            self.clear()
+        offset = _HEADER.size
+        for pos in self._positions(question):
+            self._mm[offset + (pos >> 3)] |= 1 << (pos & 7)
+        self._count += 1
+        self._write_header()
+
+    def clear(self):
+        self._mm[_HEADER.size:] = bytes(len(self._mm) - _HEADER.size)
+        self._count = 0
+        self._write_header()
+
+    def record_fetch(self, fetched: int, repeats: int):
+        # Update the moving average of how many fetched questions turn out to be repeats
+        if fetched > 0:
+            rate = repeats / fetched
+            self._repeat_rate += REPEAT_RATE_WEIGHT * (rate - self._repeat_rate)
+            self._write_header()
+
+    def fetch_size(self, wanted: int) -> int:
+        # How many questions to ask for, so that after dropping repeats there are probably `wanted` left
+        expected_fresh = max(1.0 - self._repeat_rate, 0.05)
+        return min(MAX_FETCH, math.ceil(wanted / expected_fresh))
+
+    def get_repeat_rate(self) -> float:
+        return self._repeat_rate
+
+    def __len__(self):
+        return self._count
+
+    def _write_header(self):
+        _HEADER.pack_into(self._mm, 0, MAGIC, self._num_bits, self._num_hashes, self._count, self._repeat_rate)
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.flush()
+            self._mm.close()
+            self._file.close()
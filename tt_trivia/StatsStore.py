@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+import asyncio
+from logging import Logger
+import sqlite3
+
+from GameClock import Clock, REAL_CLOCK
+
+# Pending updates are written out once this many players have some, or every FLUSH_INTERVAL seconds
+FLUSH_ROWS = 1000
+FLUSH_INTERVAL = 5.0
+LEADERBOARD_SIZE = 10
+
+# Fields of a pending update, kept as a list rather than an object since one is touched per player per question
+_NAME, _GAMES, _WINS, _ANSWERED, _CORRECT, _BEST_STREAK, _PERFECT = range(7)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_stats (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    answered INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    best_streak INTEGER NOT NULL,
+    perfect_games INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS guild_stats_leaderboard ON guild_stats (guild_id, correct DESC);
+CREATE TABLE IF NOT EXISTS global_stats (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    answered INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    best_streak INTEGER NOT NULL,
+    perfect_games INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS global_stats_leaderboard ON global_stats (correct DESC);
+"""
+_ACCUMULATE = """
+    name = excluded.name, games = games + excluded.games, wins = wins + excluded.wins,
+    answered = answered + excluded.answered, correct = correct + excluded.correct,
+    best_streak = max(best_streak, excluded.best_streak), perfect_games = perfect_games + excluded.perfect_games
+"""
+_UPSERT_GUILD = f"""
+INSERT INTO guild_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (guild_id, user_id) DO UPDATE SET {_ACCUMULATE}
+"""
+_UPSERT_GLOBAL = f"""
+INSERT INTO global_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET {_ACCUMULATE}
+"""
+_COLUMNS = "name, correct, wins, games, best_streak"
+
+
+class StatsStore:
+    """
+    Lifetime player statistics, per guild and across all guilds, in SQLite. Games only add to an in-memory buffer,
+    which merges repeated updates for the same player; the buffer is committed in one transaction on a background
+    thread once it is large enough or old enough, so the event loop never waits on the disk.
+    """
+    _pending: dict[tuple[int, int], list]
+
+    def __init__(self, path: str, logger: Logger, clock: Clock = REAL_CLOCK, flush_rows: int = FLUSH_ROWS):
+        self._path = path
+        self._logger = logger
+        self._clock = clock
+        self._flush_rows = flush_rows
+        self._pending = {}
+        self._conn: sqlite3.Connection | None = None
+        self._closed = False
+        # One thread owns the connection, so batches are committed in order and reads see every earlier batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats-store")
+        self._executor.submit(self._open).result()
+
+    def _open(self):
+        self._conn = sqlite3.connect(self._path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # Called by games
+    def _update(self, guild_id: int, user_id: int, name: str) -> list:
+        update = self._pending.get((guild_id, user_id))
+        if update is None:
+            if len(self._pending) >= self._flush_rows:
+                self.flush()
+            update = self._pending[(guild_id, user_id)] = [name, 0, 0, 0, 0, 0, 0]
+        return update
+
+    def record_answer(self, guild_id: int, user_id: int, name: str, correct: bool, streak: int):
+        update = self._update(guild_id, user_id, name)
+        update[_ANSWERED] += 1
+        if correct:
+            update[_CORRECT] += 1
+            if streak > update[_BEST_STREAK]:
+                update[_BEST_STREAK] = streak
+
+    def record_game(self, guild_id: int, user_id: int, name: str, won: bool, perfect: bool):
+        update = self._update(guild_id, user_id, name)
+        update[_NAME] = name
+        update[_GAMES] += 1
+        if won:
+            update[_WINS] += 1
+            if perfect:
+                update[_PERFECT] += 1
+
+    # Writing
+    def flush(self) -> Future:
+        batch, self._pending = self._pending, {}
+        return self._executor.submit(self._write, batch)
+
+    def _write(self, batch: dict[tuple[int, int], list]):
+        if not batch:
+            return
+        rows = [(guild_id, user_id, *update) for (guild_id, user_id), update in batch.items()]
+        try:
+            with self._conn:
+                self._conn.executemany(_UPSERT_GUILD, rows)
+                self._conn.executemany(_UPSERT_GLOBAL, [row[1:] for row in rows])
+        except sqlite3.Error as err:
+            self._logger.error("Failed to write stats for %s players: %r", len(rows), err)
+
+    async def run(self, interval: float = FLUSH_INTERVAL):
+        # Time based flushes, so quiet periods still get written out
+        while True:
+            await self._clock.sleep(interval)
+            if self._pending:
+                self.flush()
+
+    # Reading
+    async def top(self, guild_id: int | None = None, n: int = LEADERBOARD_SIZE) -> list[tuple[str, int, int, int, int]]:
+        """
+        :return: the top n players by correct answers, in the guild or globally, as (name, correct, wins, games,
+                 best streak)
+        """
+        self.flush()
+        return await asyncio.wrap_future(self._executor.submit(self._top, guild_id, n))
+
+    def _top(self, guild_id: int | None, n: int) -> list[tuple]:
+        if guild_id is None:
+            query = f"SELECT {_COLUMNS} FROM global_stats ORDER BY correct DESC LIMIT ?"
+            return self._conn.execute(query, (n,)).fetchall()
+        query = f"SELECT {_COLUMNS} FROM guild_stats WHERE guild_id = ? ORDER BY correct DESC LIMIT ?"
+        return self._conn.execute(query, (guild_id, n)).fetchall()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._executor.submit(self._conn.close)
+        self._executor.shutdown(wait=True)
@@ -4,10 +4,19 @@ import dotenv
 import os
 import logging
 import re
-import json
-from QuestionSet import QuestionSet, Qtype
-from FFAMultiChoice import FFAMultiChoice, GameStatus
+import time
+import GameLogging
+from QuestionSet import QuestionSet, Qtype, NoQuestionsError
+from QuestionPack import QuestionPack
+from FFAMultiChoice import FFAMultiChoice, GameStatus, parse_button_id
 from FFALives import FFALives
+from FFAFreeResponse import FFAFreeResponse
+from Diagnostics import Diagnostics, game_task_name
+from GameRecorder import GameRecorder
+from SeenIndex import SeenIndex
+from Categories import CATEGORIES
+from StatsStore import StatsStore
+from AdmissionControl import AdmissionController, QueueFull, MAX_GAMES, STARTS_PER_SECOND, START_BURST, MAX_QUEUED
 
 COMMANDS_LIST = """
 Commands to Terrible Trivia Bot must be prefixed with "ttt". Commands are case insensitive.
@@ -21,12 +30,26 @@ Commands:
         - 1-50 questions. Default of 20 questions.
         - type "ttt categories" for a list of categories. Default is general knowledge.
         - difficulties: easy, medium, hard. Leave blank for a mix.
-    - "ttt end": Ends any currently running game.
+        - add "speed" after the game mode, eg. "start mc speed 10", to score quick answers higher. In lives mode a
+          quick correct answer wins back a life.
+    - "start free {num of questions 1-50} {difficulty} cat {category}": Start a free response free for all game.
+        Type your answer in, small typos are forgiven. You can keep guessing until you get it right.
+    - "ttt end": Ends the game running in this channel.
+    - "leaderboard": Lifetime top players on this server. "leaderboard global" for the top players everywhere.
+    Each channel or thread can run its own game, up to a per-server limit.
+
+Admin commands (only available when the bot runs in diagnostics mode):
+    - "profile {seconds}": Run the sampling profiler and upload a flamegraph compatible stack file.
+    - "memory": Report per-game memory growth, live question views and queued tasks.
 """
 
+# Most games that can run at once in one guild, each in its own channel or thread
+MAX_GAMES_PER_GUILD = 5
+
 GAMEMODE_CLASSES = {
     "mc": FFAMultiChoice,
-    "lives": FFALives
+    "lives": FFALives,
+    "free": FFAFreeResponse
 }
 
 
@@ -34,10 +57,19 @@ class TriviaBot(nextcord.Client):
     _sound_path: str
     _sounds_available: set[str]
     _games: dict[int, FFAMultiChoice]
+    _guild_games: dict[int, set[int]]
+    _voice_locks: dict[int, asyncio.Lock]
+    _now_playing: dict[int, tuple[int, str]]
     _voice_clients: dict[int, nextcord.VoiceClient]
     _game_code_to_q_type: dict[str, Qtype]
+    _diagnostics: Diagnostics | None
+    _seen_indexes: dict[int, SeenIndex]
+    _question_pack: QuestionPack | None
+    _admission: AdmissionController
+    _background_tasks: list[asyncio.Task]
+    _stats: StatsStore
 
-    def __init__(self, sound_path):
+    def __init__(self, sound_path, diagnostics: bool = False):
         super(TriviaBot, self).__init__()
         self._game_code_to_q_type = {"mc": Qtype.MULTI_CHOICE,
                                      "lives": Qtype.MULTI_CHOICE,
@@ -45,11 +77,34 @@ class TriviaBot(nextcord.Client):
                                      "free": Qtype.FREE_RESPONSE}
         self._sound_path = sound_path
         self._sounds_available = {wavfile for wavfile in os.listdir(self._sound_path) if wavfile.endswith(".wav")}
+        # Games by channel (or thread) id, and the channels with a game in each guild
         self._games = {}
+        self._guild_games = {}
+        self._max_guild_games = int(os.getenv("MAX_GAMES_PER_GUILD", MAX_GAMES_PER_GUILD))
         self._voice_clients = {}
-        self._categories = {}
-        with open(f"{os.getenv('CATEGORIES')}", "r") as f:
-            self._categories = set(json.load(f).keys())
+        # Games in a guild share its voice client, and take turns playing sounds
+        self._voice_locks = {}
+        # Channel and sound file playing in each guild's voice channel
+        self._now_playing = {}
+        # Caps on how many games run at once and how fast they start. Excess starts wait in a queue
+        self._admission = AdmissionController(
+            max_games=int(os.getenv("MAX_GAMES", MAX_GAMES)),
+            starts_per_second=float(os.getenv("STARTS_PER_SECOND", STARTS_PER_SECOND)),
+            burst=int(os.getenv("START_BURST", START_BURST)),
+            max_queued=int(os.getenv("MAX_QUEUED_STARTS", MAX_QUEUED)))
+        self._background_tasks = []
+        # Lifetime player stats, written to disk in batches off the event loop
+        self._stats = StatsStore(os.getenv("STATS_DB", "stats.db"), logger)
+        self._diagnostics = Diagnostics(self, logger, os.getenv("DIAGNOSTICS_DIR", ".")) if diagnostics else None
+        # If set, every game is recorded to this directory for replaying with Replay.py
+        self._record_dir = os.getenv("RECORD_DIR")
+        # Per-guild indexes of questions already asked, so games in a guild don't repeat questions
+        self._seen_dir = os.getenv("SEEN_DIR", "seen")
+        self._seen_indexes = {}
+        # If set, questions are drawn from this JSONL or CSV pack rather than opentdb
+        pack_path = os.getenv("QUESTION_PACK")
+        self._question_pack = QuestionPack(pack_path) if pack_path else None
+        self._categories = self._question_pack if self._question_pack is not None else CATEGORIES
 
     async def _cleanup_clients(self):
         for client in self._voice_clients.values():
@@ -78,133 +133,300 @@ class TriviaBot(nextcord.Client):
             if msg == "help" or msg == "commands" or msg == "command list":
                 await channel.send(COMMANDS_LIST)
             elif msg == "categories":
-                cat_string = "Categories:\n\t- " + "\n\t- ".join(self._categories)
+                cat_string = "Categories:\n\t- " + "\n\t- ".join(self._categories.names())
                 await channel.send(cat_string)
             elif msg.startswith("start "):
-                # only start a game if one is not already begun for this guild
-                if message.guild.id not in self._games:
-                    if await self._setup_game(msg, message.guild.id):
+                # only start a game if one is not already begun for this channel
+                c_id = message.channel.id
+                if c_id in self._games:
+                    await message.reply(f"Cannot start a new game while one is currently running in this channel.")
+                elif len(self._guild_games.get(message.guild.id, ())) >= self._max_guild_games:
+                    await message.reply(f"This server already has {self._max_guild_games} games running. "
+                                        f"Please wait for one to finish.")
+                elif set_up := await self._setup_game(msg, message.guild.id, c_id):
+                    if await self._admit_game(message, c_id):
                         await message.reply("**Success! Starting your game...**\n")
-                        await self._games[message.guild.id].start()
-                    else:
-                        await message.reply("Ooops, invalid start command. Type \"ttt help\" or \"ttt commands\" for help.")
-                else:
-                    await message.reply(f"Cannot start a new game while one is currently running on this server.")
+                        await self._start_game(message, c_id)
+                elif set_up is False:
+                    await message.reply("Ooops, invalid start command. Type \"ttt help\" or \"ttt commands\" for help.")
             elif msg == "end":
-                if self.has_game(message.guild.id):
-                    await self._games[message.guild.id].end()
-        elif self.has_game(message.guild.id):
-            await self._pass_message_to_game(message, message.guild.id)
+                if self.has_game(message.channel.id):
+                    await self._games[message.channel.id].end()
+            elif msg == "leaderboard" or msg == "leaderboard global":
+                await self._leaderboard_command(msg, message)
+            elif msg.startswith("profile") or msg == "memory":
+                await self._diagnostics_command(msg, message)
+        elif message.channel.id in self._games:
+            await self._pass_message_to_game(message, message.channel.id)
+
+    async def _admit_game(self, message: nextcord.Message, c_id: int) -> bool:
+        # Wait for the admission controller to let the game start. False if the game was ended or shed meanwhile
+        try:
+            admitted = self._admission.request(c_id)
+        except QueueFull as err:
+            logger.warning("Shedding game start for channel %s: %s", c_id, err)
+            self.cleanup_game(self._games[c_id])
+            await message.reply("Too many games are waiting to start right now. Please try again in a few minutes.")
+            return False
+        if not admitted.done():
+            await message.reply(f"Lots of games are running right now. Yours is number "
+                                f"{self._admission.position(c_id)} in the queue and will start automatically.")
+            await asyncio.wait([admitted])
+        return not admitted.cancelled()
+
+    async def _start_game(self, message: nextcord.Message, c_id: int):
+        # Runs the game. If it fails before it gets going, eg. fetching questions, its slot is given back
+        game = self._games[c_id]
+        try:
+            await game.start()
+        except Exception as err:
+            logger.error("Game %s failed to start: %r", c_id, err)
+            self.cleanup_game(game)
+            await message.reply("Sorry, couldn't get the questions for your game. Please try again in a minute.")
 
-    async def _pass_message_to_game(self, message: nextcord.Message, g_id: int):
-        game: FFAMultiChoice = self._games[g_id]
+    async def _leaderboard_command(self, msg: str, message: nextcord.Message):
+        if msg.endswith("global"):
+            title, rows = "Global leaderboard", await self._stats.top()
+        else:
+            title, rows = f"{message.guild.name} leaderboard", await self._stats.top(message.guild.id)
+        if not rows:
+            await message.channel.send("Nobody has played a game yet!")
+            return
+        board = f"**{title}**"
+        for i, (name, correct, wins, games, best_streak) in enumerate(rows):
+            board += f"\n{i + 1}. {name}: {correct} correct, {wins}/{games} games won, best streak {best_streak}"
+        await message.channel.send(board)
+
+    async def _diagnostics_command(self, msg: str, message: nextcord.Message):
+        if self._diagnostics is None:
+            await message.reply("Diagnostics mode is not enabled.")
+            return
+        if not message.author.guild_permissions.administrator:
+            await message.reply("Only server admins may use diagnostic commands.")
+            return
+        if msg == "memory":
+            await message.channel.send(await self._diagnostics.leak_report())
+            return
+        seconds = msg.removeprefix("profile").strip()
+        if not seconds.isdigit():
+            await message.reply("Usage: \"ttt profile {seconds}\"")
+            return
+        await message.reply(f"Profiling for {seconds} seconds...")
+        try:
+            path, samples = await self._diagnostics.profile(int(seconds))
+        except RuntimeError as err:
+            await message.reply(str(err))
+            return
+        await message.channel.send(f"Collected {samples} samples.", file=nextcord.File(path))
+
+    async def _pass_message_to_game(self, message: nextcord.Message, c_id: int):
+        game: FFAMultiChoice = self._games[c_id]
+        # Name the handler task after the game so slow callbacks can be attributed to it
+        asyncio.current_task().set_name(game_task_name(c_id, "message"))
         if game.get_state() == GameStatus.GETTING_PLAYERS:
             if message.content.startswith("play"):
-                print(type(message.author))
                 if game.add_player(message.author):
-                    await self.say(g_id, f"{message.author.name} added to players!")
+                    await self.say(c_id, f"{message.author.name} added to players!")
         elif game.get_state() == GameStatus.WAIT_ANSWERS:
             game.receive_answer(message)
 
+    async def on_interaction(self, interaction: nextcord.Interaction):
+        button = None
+        if interaction.type == nextcord.InteractionType.component:
+            button = parse_button_id(interaction.data.get("custom_id", ""))
+        if button is None:
+            await super().on_interaction(interaction)
+            return
+        c_id, choice = button
+        game = self._games.get(c_id)
+        # Buttons outlive their question, and their game if the bot restarted
+        if game is None or game.get_state() != GameStatus.WAIT_ANSWERS or interaction.message is None or \
+                not game.is_question_message(interaction.message.id):
+            await interaction.response.send_message("That question is closed.", ephemeral=True)
+            return
+        game.receive_button_answer(choice, interaction)
+        # Acknowledge the press without changing the message, or Discord shows it as failed
+        await interaction.response.defer()
+
     async def on_ready(self):
         logger.info(f"{self.user} logged on.")
         for guild in self.guilds:
             logger.info(f"Connected to guild {guild.name} with id {guild.id}")
         await self._init_voice_clients()
+        # on_ready fires again after reconnects, only start the background tasks once
+        if not self._background_tasks:
+            self._background_tasks = [
+                asyncio.create_task(CATEGORIES.refresh_forever(logger), name="ttt-category-counts"),
+                asyncio.create_task(self._admission.monitor(), name="ttt-admission-monitor"),
+                asyncio.create_task(self._stats.run(), name="ttt-stats-flush"),
+            ]
 
-    async def speak(self, guild_id: int, announcements: list[tuple[str, str | None]]):
+    async def on_http_ratelimit(self, limit: int, remaining: int, reset_after: float, bucket: str, scope: str | None):
+        self._admission.note_rate_limit(reset_after)
+
+    async def on_global_http_ratelimit(self, retry_after: float):
+        self._admission.note_rate_limit(retry_after)
+
+    async def speak(self, channel_id: int, announcements: list[tuple[str, str | None]]):
         # "Speaks" ie. prints a message and plays a sound over voice client (if possible)
-        guild: nextcord.Guild = nextcord.utils.find(lambda g: g.id == guild_id, self.guilds)
-        if guild is None:
-            raise ValueError(f"Invalid guild id {guild_id}")
         for announcement in announcements:
-            await self.say(guild_id, announcement[0], announcement[1])
+            await self.say(channel_id, announcement[0], announcement[1])
 
-    async def say(self, guild_id: int, msg: str, sound_file: str | None = None, view: nextcord.ui.View | None = None):
+    async def say(self, channel_id: int, msg: str, sound_file: str | None = None,
+                  view: nextcord.ui.View | None = None):
         """
         "Speaks" ie. prints a message and plays a sound over voice client (if possible)
-        :param guild_id:
+        :param channel_id: text channel or thread the game is running in
         :param msg:
         :param sound_file:
         :param view:
-        :return: None
+        :return: the sent message
         """
-        guild: nextcord.Guild = nextcord.utils.find(lambda g: g.id == guild_id, self.guilds)
-        if guild is None:
-            raise ValueError(f"Invalid guild id {guild_id}")
-        text_channel: nextcord.TextChannel = nextcord.utils.get(guild.text_channels, name="terrible-trivia")
-        voice_client: nextcord.VoiceClient = self._voice_clients.get(guild_id)
-        if text_channel is not None:
-            await text_channel.send(msg, view=view)
+        text_channel: nextcord.abc.Messageable = self.get_channel(channel_id)
+        if text_channel is None:
+            raise ValueError(f"Invalid channel id {channel_id}")
+        g_id = text_channel.guild.id
+        voice_client: nextcord.VoiceClient = self._voice_clients.get(g_id)
+        sent = await text_channel.send(msg, view=view)
         if voice_client is not None and sound_file is not None:
-            while voice_client.is_playing():
-                await asyncio.sleep(1)
-            source_path = os.path.join(self._sound_path, sound_file)
-            audio_source = nextcord.PCMVolumeTransformer(nextcord.FFmpegPCMAudio(source_path), volume=0.75)
-            voice_client.play(audio_source)
+            if g_id not in self._voice_locks:
+                self._voice_locks[g_id] = asyncio.Lock()
+            # Hold the lock until the sound has started, so two games can't both see the voice client idle
+            async with self._voice_locks[g_id]:
+                while voice_client.is_playing():
+                    await asyncio.sleep(1)
+                source_path = os.path.join(self._sound_path, sound_file)
+                audio_source = nextcord.PCMVolumeTransformer(nextcord.FFmpegPCMAudio(source_path), volume=0.75)
+                voice_client.play(audio_source)
+                self._now_playing[g_id] = (channel_id, sound_file)
+        return sent
+
+    def stop_sound(self, channel_id: int, sound_file: str):
+        # Stop a sound a game started, if it's still playing. Other games' sounds are left alone
+        text_channel = self.get_channel(channel_id)
+        if text_channel is None:
+            return
+        g_id = text_channel.guild.id
+        voice_client: nextcord.VoiceClient = self._voice_clients.get(g_id)
+        if voice_client is not None and voice_client.is_playing() and \
+                self._now_playing.get(g_id) == (channel_id, sound_file):
+            voice_client.stop()
 
-    async def _setup_game(self, msg: str, guild_id: int):
+    async def _setup_game(self, msg: str, guild_id: int, channel_id: int) -> bool | None:
+        # True if the game was set up, False for an invalid start command, None if the channel was already told why not
         parsed_setup_tuple = self._parse_start_message(msg)
-        if parsed_setup_tuple is None or len(parsed_setup_tuple) != 3:
+        if parsed_setup_tuple is None or len(parsed_setup_tuple) != 4:
             return False
         try:
             game_mode = parsed_setup_tuple[0]
-            print(f"Game Mode: {game_mode}\nGAMEMODE_CLASSES keys:")
-            for k in GAMEMODE_CLASSES.keys():
-                print(k)
+            logger.debug("Setting up %s game for guild %s in channel %s", game_mode, guild_id, channel_id)
             q_set_kwargs = parsed_setup_tuple[2]
-            game = GAMEMODE_CLASSES[game_mode](q_set_kwargs, guild_id, self, logger)
-            self._games[guild_id] = game
+            requested = q_set_kwargs.get("num")
+            # Games in the same guild share its seen question index
+            q_set_kwargs["seen"] = self._get_seen_index(guild_id)
+            q_set_kwargs["provider"] = self._question_pack
+            game = GAMEMODE_CLASSES[game_mode](q_set_kwargs, guild_id, self, logger, channel_id=channel_id)
+            game.set_stats_store(self._stats)
+            # The question set asks for no more questions than the category and difficulty have
+            if requested is not None and game.get_num_questions() < requested:
+                logger.info("Capped game in channel %s to %s of %s requested questions", channel_id,
+                            game.get_num_questions(), requested)
+                await self.say(channel_id, f"Only {game.get_num_questions()} questions are available for that category "
+                                           f"and difficulty, so the game will have {game.get_num_questions()}.")
+            game.set_speed_scoring(parsed_setup_tuple[3])
+            self._games[channel_id] = game
+            self._guild_games.setdefault(guild_id, set()).add(channel_id)
+            if self._record_dir is not None:
+                log_path = os.path.join(self._record_dir,
+                                        f"{guild_id}-{channel_id}-{time.strftime('%Y%m%d-%H%M%S')}.tttr")
+                game.set_recorder(GameRecorder(log_path, type(game).__name__, guild_id))
+            if self._diagnostics is not None:
+                self._diagnostics.track_game(game)
             return True
             # else:
             #     return False
-        except ValueError | AssertionError as err:
+        except NoQuestionsError as err:
+            logger.info("Not starting game in channel %s: %s", channel_id, err)
+            await self.say(channel_id, f"{err}, try another category or difficulty.")
+            return None
+        except (ValueError, AssertionError) as err:
             logger.error(f"Exception: {err}")
             return False
 
-    def _parse_start_message(self, msg: str) -> tuple[str, QuestionSet] | None:
-        # Some wacky regex to parse and extract the start command args. Pass via arglist to QuestionSet ctor
-        print(f"{msg=}")
-        command_pattern = re.compile("start (mc|tf|free|lives)( \d{1,2})?( (easy|medium|hard))?( cat [a-zA-Z &]+$)?")
-        num_pattern = re.compile("\d{1,2}")
-        diff_pattern = re.compile("easy|medium|hard")
-        cat_pattern = re.compile("cat [a-zA-Z &]+$")
-        gamemode_pattern = re.compile("(mc|tf|free|lives)")
-        if command_pattern.fullmatch(msg) is None:
+    def _parse_start_message(self, msg: str) -> tuple[str, Qtype, dict, bool] | None:
+        # Some wacky regex to parse and extract the start command args. Pass via arglist to QuestionSet ctor.
+        # Category names are whatever the categories or question pack call them, eg. "90s music", so any text is
+        # accepted here and checked against the known names
+        command_pattern = re.compile(r"start (?P<mode>mc|tf|free|lives)(?P<speed> speed)?( (?P<num>\d{1,2}))?"
+                                     r"( (?P<difficulty>easy|medium|hard))?( cat (?P<category>\S.*))?")
+        match = command_pattern.fullmatch(msg)
+        if match is None:
             logger.info(f"Invalid start command: {msg}")
             return None
         try:
-            chunks = msg.removeprefix("start ").split()
-            q_type = self._game_code_to_q_type[chunks[0]]
+            game_mode = match["mode"]
+            q_type = self._game_code_to_q_type[game_mode]
             q_set_kwargs = {}
-            if match := num_pattern.search(msg):
-                q_set_kwargs["num"] = int(msg[match.start(): match.end()])
-            if match := diff_pattern.search(msg):
-                q_set_kwargs["difficulty"] = msg[match.start(): match.end()]
-            if match := cat_pattern.search(msg):
-                q_set_kwargs["category"] = msg[match.start()+4: match.end()]  # add 4 to remove "cat" portion
-            if match := gamemode_pattern.search(msg):
-                print("Matched a game mode")
-                game_mode = msg[match.start(): match.end()].strip()
-                return game_mode, q_type, q_set_kwargs  # QuestionSet(q_type, **kwargs)
-            else:
-                logger.error("I botched the RegEx")
-                return None
+            speed_scoring = match["speed"] is not None
+            if match["num"] is not None:
+                q_set_kwargs["num"] = int(match["num"])
+            if match["difficulty"] is not None:
+                q_set_kwargs["difficulty"] = match["difficulty"]
+            if match["category"] is not None:
+                q_set_kwargs["category"] = match["category"].strip()
+                if q_set_kwargs["category"] not in self._categories:
+                    logger.info("Unknown category in start command: %s", msg)
+                    return None
+            return game_mode, q_type, q_set_kwargs, speed_scoring  # QuestionSet(q_type, **kwargs)
         except Exception as err:
             logger.error(f"Exception: {type(err)} {err}")
             return None
 
     def cleanup_game(self, game: FFAMultiChoice):
-        g_id = game.get_guild_id()
-        if self.has_game(g_id):
-            print(f"Deleting game for guild: {g_id}")
-            del self._games[g_id]
+        c_id = game.get_channel_id()
+        if self._games.get(c_id) is game:
+            logger.info("Deleting game for channel %s in guild %s", c_id, game.get_guild_id())
+            del self._games[c_id]
+            guild_games = self._guild_games.get(game.get_guild_id())
+            if guild_games is not None:
+                guild_games.discard(c_id)
+                if not guild_games:
+                    del self._guild_games[game.get_guild_id()]
+            self._admission.release(c_id)
+            logger.info("Game %s latency: %s", c_id, game.get_latency_report())
+            dropped = game.get_dropped_answers()
+            if any(dropped.values()):
+                logger.info("Game %s dropped answers: %s", c_id, dropped)
+            if game.get_recorder() is not None:
+                game.get_recorder().close()
+            if self._diagnostics is not None:
+                self._diagnostics.release_game(game)
+
+    def _get_seen_index(self, guild_id: int) -> SeenIndex:
+        if guild_id not in self._seen_indexes:
+            os.makedirs(self._seen_dir, exist_ok=True)
+            self._seen_indexes[guild_id] = SeenIndex(os.path.join(self._seen_dir, f"{guild_id}.seen"))
+        return self._seen_indexes[guild_id]
+
+    def has_game(self, c_id: int):
+        return c_id in self._games
 
-    def has_game(self, g_id: int):
-        return g_id in self._games
+    def get_game(self, c_id: int) -> FFAMultiChoice:
+        return self._games[c_id]
+
+    def enable_diagnostics(self, loop: asyncio.AbstractEventLoop):
+        if self._diagnostics is not None:
+            self._diagnostics.enable(loop)
 
     async def close(self):
         await self._cleanup_clients()
+        for task in self._background_tasks:
+            task.cancel()
+        for seen_index in self._seen_indexes.values():
+            seen_index.close()
+        self._stats.close()
+        if self._question_pack is not None:
+            self._question_pack.close()
         await super().close()
 
 
@@ -223,15 +445,16 @@ async def main(bot):
 if __name__ == "__main__":
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    # Add some logging
-    logger = logging.getLogger('nextcord')
-    logger.setLevel(logging.DEBUG)
-    handler = logging.FileHandler(filename='trivia.log', encoding='utf-8', mode='w')
-    handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-    logger.addHandler(handler)
     dotenv.load_dotenv("../.env")
+    # Logging is formatted and written to disk on a background thread, with optional per-category levels and
+    # sampling, eg. LOG_LEVELS="answers=DEBUG" LOG_SAMPLING="grading=0.1". Answers and grading are only logged at DEBUG
+    logger = logging.getLogger('nextcord')
+    log_listener = GameLogging.setup_logging(logger, "trivia.log", os.getenv("LOG_LEVEL", "INFO").upper(),
+                                             GameLogging.parse_category_config(os.getenv("LOG_LEVELS")),
+                                             GameLogging.parse_category_config(os.getenv("LOG_SAMPLING")))
     sound_dir = os.getenv("SOUNDS")
-    bot = TriviaBot(sound_dir)
+    bot = TriviaBot(sound_dir, diagnostics=os.getenv("DIAGNOSTICS", "0") == "1")
+    bot.enable_diagnostics(loop)
     try:
         loop.run_until_complete(main(bot))
     except KeyboardInterrupt as e:
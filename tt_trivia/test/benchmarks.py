@@ -0,0 +1,614 @@
+"""
+Offline performance benchmarks for the game engine hot paths.
+
+Run from the tt_trivia directory:
+    python test/benchmarks.py [--only NAME] [--quick] [--baseline FILE] [--save-baseline FILE]
+
+Every run is appended to a JSON lines history file. When a baseline is given, any benchmark whose throughput drops by
+more than the threshold is flagged and the exit code is 1.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+TT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TT_DIR)
+
+from FFAGame import GameStatus  # noqa: E402
+from FFAMultiChoice import FFAMultiChoice, button_id, parse_button_id  # noqa: E402
+from FFALives import FFALives  # noqa: E402
+from FFAFreeResponse import FFAFreeResponse  # noqa: E402
+from AnswerMatcher import AnswerMatcher  # noqa: E402
+from QuestionSet import QuestionSet, Qtype, OpenTDBProvider  # noqa: E402
+from QuestionPack import QuestionPack, INDEX_SUFFIX  # noqa: E402
+from GameClock import VirtualClock  # noqa: E402
+from GameRecorder import GameRecorder  # noqa: E402
+from StatsStore import StatsStore  # noqa: E402
+import Replay  # noqa: E402
+
+HISTORY_FILE = os.path.join(TT_DIR, "test", "bench_history.jsonl")
+REGRESSION_THRESHOLD = 0.15
+PLAYER_COUNTS = (10, 100, 1000, 10000)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+# Stubbed nextcord objects
+class FakeBot:
+    """Stand-in for TriviaBot which swallows all output."""
+    def __init__(self):
+        self.cleaned_up = []
+
+    async def say(self, channel_id, msg, sound_file=None, view=None):
+        pass
+
+    async def speak(self, channel_id, announcements):
+        pass
+
+    def stop_sound(self, channel_id, sound_file):
+        pass
+
+    def cleanup_game(self, game):
+        self.cleaned_up.append(game)
+
+
+class SimulatedBot(FakeBot):
+    """
+    Bot which drives a game by reacting to its announcements: players join when the lobby opens and answer each
+    question after a random reaction time.
+    """
+    def __init__(self, num_players: int, accuracy: float = 0.5, reaction_time: tuple[float, float] = (0.5, 10)):
+        super().__init__()
+        self.game = None
+        self._users = [fake_user(i) for i in range(num_players)]
+        self._accuracy = accuracy
+        self._reaction_time = reaction_time
+
+    async def say(self, channel_id, msg, sound_file=None, view=None):
+        if msg.startswith("Game starting in") and self.game.get_state() == GameStatus.GETTING_PLAYERS:
+            for user in self._users:
+                self.game.add_player(user)
+        elif msg.endswith("seconds to type your answer.\n\n"):
+            for user in self._users:
+                answer = self.game._current_question.answer if random.random() < self._accuracy else "no idea"
+                asyncio.create_task(self._answer(fake_message(answer, user), random.uniform(*self._reaction_time)))
+        elif msg.endswith("seconds to answer.\n\n"):
+            correct = "abcd"[self.game._current_question.answer_index]
+            for user in self._users:
+                answer = correct if random.random() < self._accuracy else random.choice("abcd")
+                asyncio.create_task(self._answer(fake_message(answer, user), random.uniform(*self._reaction_time)))
+
+    async def _answer(self, message, delay: float):
+        await self.game._clock.sleep(delay)
+        # Same check TriviaBot makes before passing a message to the game
+        if self.game.get_state() == GameStatus.WAIT_ANSWERS:
+            self.game.receive_answer(message)
+
+
+def fake_user(u_id: int):
+    return SimpleNamespace(id=u_id, name=f"player{u_id}")
+
+
+def fake_message(content: str, author):
+    return SimpleNamespace(content=content, author=author, created_at=None)
+
+
+def fake_interaction(user):
+    return SimpleNamespace(user=user, created_at=None)
+
+
+def _b64(s: str) -> str:
+    return base64.b64encode(s.encode("utf-8")).decode("ascii")
+
+
+def make_payload(n: int) -> list[dict]:
+    # Mimics the base64 encoded results of the opentdb api
+    return [{
+        "category": _b64("General Knowledge"),
+        "type": _b64("multiple"),
+        "difficulty": _b64(random.choice(("easy", "medium", "hard"))),
+        "question": _b64(f"Which of these is the answer to question number {i}, with some padding text?"),
+        "correct_answer": _b64(f"Correct {i}"),
+        "incorrect_answers": [_b64(f"Wrong {i} {j}") for j in range(3)],
+    } for i in range(n)]
+
+
+def make_question_set(num: int, q_type: Qtype = Qtype.MULTI_CHOICE) -> QuestionSet:
+    questions = QuestionSet(q_type, num=min(num, 50))
+    questions.load(OpenTDBProvider.construct_questions(make_payload(num), q_type))
+    return questions
+
+
+def make_game(cls, num_players: int, num_questions: int = 10, bot=None, clock=None, g_id: int = 1):
+    bot = bot if bot is not None else FakeBot()
+    game = cls({}, g_id, bot, _quiet_logger(), clock)
+    game._questions = make_question_set(num_questions, game._questions.get_q_type())
+    game._status = GameStatus.GETTING_PLAYERS
+    for i in range(num_players):
+        game.add_player(fake_user(i))
+    return game
+
+
+def _quiet_logger():
+    import logging
+    logger = logging.getLogger("benchmarks")
+    logger.setLevel(logging.WARNING)
+    return logger
+
+
+def _measure(func, ops: int, repeat: int, setup=None) -> float:
+    # Best of `repeat` runs, in operations per second. Only func is timed, it's passed the result of setup
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return ops / best
+
+
+def _measure_async(coro_func, ops: int, repeat: int, setup=None, clock: VirtualClock | None = None) -> float:
+    # Runs on the virtual clock's loop if given, so the game's timers don't wait in real time
+    loop = clock.loop if clock is not None else asyncio.new_event_loop()
+    try:
+        return _measure(lambda arg: loop.run_until_complete(coro_func(arg)), ops, repeat, setup)
+    finally:
+        clock.close() if clock is not None else loop.close()
+
+
+# Benchmarks. Each takes the options and returns a dict of result name -> operations per second
+@benchmark("construct_question")
+def bench_construct_question(opts):
+    payload = make_payload(5000)
+    mc = Qtype.MULTI_CHOICE
+    return {"construct_question": _measure(lambda _: [OpenTDBProvider.construct_question(q, mc) for q in payload],
+                                           len(payload), opts.repeat)}
+
+
+@benchmark("question_repr")
+def bench_question_repr(opts):
+    # Per-question dataclasses against packed questions: building a batch, reading every field, and memory held
+    results = {}
+    payload = make_payload(5000)
+    mc = Qtype.MULTI_CHOICE
+
+    def read_all(batch):
+        for q in batch:
+            q.question, q.answer, q.choices, q.answer_index, q.cat, q.diff
+
+    for name, construct in (("dataclass", lambda: [OpenTDBProvider.construct_question(q, mc) for q in payload]),
+                            ("packed", lambda: OpenTDBProvider.construct_questions(payload, mc))):
+        results[f"construct_questions[{name}]"] = _measure(lambda _: construct(), len(payload), opts.repeat)
+        results[f"read_questions[{name}]"] = _measure(read_all, len(payload), opts.repeat, construct)
+        tracemalloc.start()
+        batch = construct()
+        held = tracemalloc.get_traced_memory()[0]
+        read_all(batch[:50])
+        # A game only ever reads the questions it asks
+        held_after_game = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[f"question_memory[{name}][bytes]"] = held / len(payload)
+        results[f"question_memory_after_50_asked[{name}][bytes]"] = held_after_game / len(payload)
+        del batch
+    return results
+
+
+@benchmark("receive_answer")
+def bench_receive_answer(opts):
+    results = {}
+    num_messages = 20000
+
+    async def run():
+        game = make_game(FFAMultiChoice, 1000)
+        game._current_question = game._questions._questions[0]
+        # 1 in 4 messages is from a non-player
+        messages = [fake_message(random.choice(("a", "b", "c", "d", "chatter", "Correct 0")),
+                                 fake_user(random.randrange(1333))) for _ in range(num_messages)]
+        interactions = [fake_interaction(msg.author) for msg in messages]
+
+        def text(_):
+            for msg in messages:
+                game.receive_answer(msg)
+                game._players.get(msg.author.id, SimpleNamespace()).answer = None
+
+        def buttons(_):
+            for interaction in interactions:
+                game.receive_button_answer("a", interaction)
+                game._players.get(interaction.user.id, SimpleNamespace()).answer = None
+
+        # Button presses as TriviaBot.on_interaction routes them: custom id to channel to game
+        games = {game.get_channel_id(): game}
+        custom_ids = [button_id(game.get_channel_id(), random.choice("abcd")) for _ in interactions]
+
+        def routed(_):
+            for custom_id, interaction in zip(custom_ids, interactions):
+                c_id, choice = parse_button_id(custom_id)
+                games[c_id].receive_button_answer(choice, interaction)
+                game._players.get(interaction.user.id, SimpleNamespace()).answer = None
+
+        results["receive_answer"] = _measure(text, num_messages, opts.repeat)
+        results["receive_button_answer"] = _measure(buttons, num_messages, opts.repeat)
+        results["receive_button_answer[routed]"] = _measure(routed, num_messages, opts.repeat)
+        # A handful of players flooding the channel, mostly with long or repeated messages
+        spammers = [fake_user(i) for i in range(5)]
+        spam = [fake_message(random.choice(("a", "a", "lol" * 100, f"spam {random.randrange(100)}")),
+                             random.choice(spammers)) for _ in range(num_messages)]
+
+        def flood(_):
+            for msg in spam:
+                game.receive_answer(msg)
+        results["receive_answer[spam]"] = _measure(flood, num_messages, opts.repeat)
+        game._reset_answers()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            game.set_recorder(GameRecorder(os.path.join(tmp_dir, "bench.tttr"), "FFAMultiChoice", 1))
+            game.get_recorder().start(0)
+            results["receive_answer[recorded]"] = _measure(text, num_messages, opts.repeat)
+            game.get_recorder().close().result()
+    asyncio.run(run())
+    return results
+
+
+@benchmark("free_response")
+def bench_free_response(opts):
+    # A busy channel: mostly wrong or repeated guesses, some typos and some exact answers
+    results = {}
+    num_guesses = 20000
+    answer = "Leonardo da Vinci"
+    pool = ["leonardo da vinci", "Leonardo DaVinci", "leonrado da vinci", "Michelangelo", "raphael", "donatello",
+            "da vinci", "lol", "idk", "The Leonardo da Vinci!", "Vincent van Gogh", "leo"]
+    guesses = [random.choice(pool) if random.random() < 0.7 else f"random guess {random.randrange(5000)}"
+               for _ in range(num_guesses)]
+
+    def match(_):
+        matcher = AnswerMatcher(answer)
+        for guess in guesses:
+            matcher.matches(guess)
+
+    def match_uncached(_):
+        for guess in guesses[:2000]:
+            AnswerMatcher(answer).matches(guess)
+    results["free_response_match"] = _measure(match, num_guesses, opts.repeat)
+    results["free_response_match[uncached]"] = _measure(match_uncached, 2000, opts.repeat)
+
+    async def run():
+        game = make_game(FFAFreeResponse, 1000)
+        game._current_question = game._questions.get_questions()[0]
+        game._matcher = AnswerMatcher(answer)
+        messages = [fake_message(guess, fake_user(random.randrange(1333))) for guess in guesses]
+
+        def ingest(_):
+            for msg in messages:
+                game.receive_answer(msg)
+            game._reset_answers()
+        results["free_response_receive_answer"] = _measure(ingest, num_guesses, opts.repeat)
+    asyncio.run(run())
+    return results
+
+
+@benchmark("end_question")
+def bench_end_question(opts):
+    results = {}
+    for count in opts.player_counts:
+        clock = VirtualClock()
+
+        def setup():
+            game = make_game(FFAMultiChoice, count, clock=clock)
+            game._set_status = _noop_status
+            game._current_question = game._questions._questions[0]
+            for player in game._players.values():
+                player.answer = random.choice("abcd")
+            game._status = GameStatus.QUESTION_RESULTS
+            return game
+
+        async def grade(game):
+            await game._end_question()
+        results[f"end_question[{count}]"] = _measure_async(grade, count, opts.repeat, setup, clock)
+    return results
+
+
+@benchmark("end_game")
+def bench_end_game(opts):
+    results = {}
+    for count in opts.player_counts:
+        def setup():
+            game = make_game(FFAMultiChoice, count)
+            for player in game._players.values():
+                player.score = random.randrange(20)
+            return game
+
+        async def rank(game):
+            await game._end_game()
+        results[f"end_game[{count}]"] = _measure_async(rank, count, opts.repeat, setup)
+    return results
+
+
+@benchmark("eliminate_players")
+def bench_eliminate_players(opts):
+    results = {}
+    for count in opts.player_counts:
+        def setup():
+            game = make_game(FFALives, count)
+            game._set_status = _noop_status
+            # Mass elimination, 90% of players out in one question
+            for player in list(game._players.values())[: count * 9 // 10]:
+                player.score = 0
+            return game
+
+        async def eliminate(game):
+            await game._eliminate_players()
+        results[f"eliminate_players[{count}]"] = _measure_async(eliminate, count, opts.repeat, setup)
+    return results
+
+
+async def simulate_game(cls, num_players: int, clock: VirtualClock, g_id: int = 1, num_questions: int = 10,
+                        recorder: GameRecorder | None = None, early_close: bool = True, speed_scoring: bool = False,
+                        reaction_time: tuple[float, float] = (0.5, 10)):
+    # Plays one complete game, lobby to final scores, with simulated players
+    bot = SimulatedBot(num_players, reaction_time=reaction_time)
+    game = make_game(cls, 0, num_questions=num_questions, bot=bot, clock=clock, g_id=g_id)
+    game._status = GameStatus.STARTING
+    game.set_early_close(early_close)
+    game.set_speed_scoring(speed_scoring)
+    if recorder is not None:
+        game.set_recorder(recorder)
+    bot.game = game
+    if issubclass(cls, FFALives):
+        game._questions.initialize = _refill(game._questions)
+    try:
+        await game.start()
+    except asyncio.CancelledError:
+        # The lives mode cancels its own task stack on the way out
+        pass
+    return game
+
+
+@benchmark("full_game")
+def bench_full_game(opts):
+    results = {}
+    num_games = 20 if opts.quick else 100
+
+    async def play(cls):
+        for _ in range(num_games):
+            await simulate_game(cls, 10, clock)
+    for cls in (FFAMultiChoice, FFALives, FFAFreeResponse):
+        clock = VirtualClock()
+        results[f"full_game[{cls.__name__}]"] = _measure_async(lambda _: play(cls), num_games, opts.repeat,
+                                                               clock=clock)
+    return results
+
+
+@benchmark("concurrent_games")
+def bench_concurrent_games(opts):
+    # Load test: many games interleaved on one (virtual) event loop
+    results = {}
+    num_games = 100 if opts.quick else 1000
+
+    async def play(cls):
+        await asyncio.gather(*(simulate_game(cls, 10, clock, g_id=g_id) for g_id in range(num_games)))
+    for cls in (FFAMultiChoice, FFALives):
+        clock = VirtualClock()
+        results[f"concurrent_games[{cls.__name__}]"] = _measure_async(lambda _: play(cls), num_games, opts.repeat,
+                                                                      clock=clock)
+    return results
+
+
+@benchmark("early_close")
+def bench_early_close(opts):
+    # Game length in game time, for a small lobby, with and without closing the answer window once everyone answers
+    results = {}
+    num_games = 5 if opts.quick else 20
+    for cls in (FFAMultiChoice, FFALives):
+        for early_close in (False, True):
+            clock = VirtualClock()
+
+            async def play():
+                durations = []
+                for g_id in range(num_games):
+                    start = clock.now()
+                    await simulate_game(cls, 4, clock, g_id=g_id, early_close=early_close)
+                    durations.append(clock.now() - start)
+                return sum(durations) / len(durations)
+            duration = clock.run(play())
+            clock.close()
+            mode = "early_close" if early_close else "full_window"
+            results[f"game_duration[{cls.__name__}][{mode}][seconds]"] = duration
+            results[f"games[{cls.__name__}][{mode}][per hour]"] = 3600 / duration
+    return results
+
+
+def make_pack(path: str, n: int):
+    # A JSONL question pack with n questions over 20 categories
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({
+                "category": f"category {i % 20}", "difficulty": ("easy", "medium", "hard")[i % 3], "type": "multiple",
+                "question": f"Which of these is the answer to question number {i}, with some padding text?",
+                "correct_answer": f"Correct {i}", "incorrect_answers": [f"Wrong {i} {j}" for j in range(3)],
+            }) + "\n")
+
+
+@benchmark("question_pack")
+def bench_question_pack(opts):
+    # Opening and drawing games from packs of increasing size. Memory per game drawn should stay flat, and the index
+    # should cost a few bytes per question, however big the pack
+    results = {}
+    sizes = (10000, 100000) if opts.quick else (10000, 100000, 500000)
+    num_draws = 200
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            path = os.path.join(tmp_dir, f"pack{size}.jsonl")
+            make_pack(path, size)
+
+            def uncached():
+                if os.path.exists(path + INDEX_SUFFIX):
+                    os.remove(path + INDEX_SUFFIX)
+            results[f"pack_index_build[{size}]"] = _measure(lambda _: QuestionPack(path).close(), size, 1, uncached)
+            results[f"pack_open[{size}]"] = _measure(lambda _: QuestionPack(path).close(), size, opts.repeat)
+            tracemalloc.start()
+            pack = QuestionPack(path)
+            results[f"pack_index_memory[{size}][bytes]"] = tracemalloc.get_traced_memory()[0] / size
+            # Warm the selection cache, so only the draw itself is traced
+            pack.draw(Qtype.MULTI_CHOICE, "any", "any", 1)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            questions = pack.draw(Qtype.MULTI_CHOICE, "any", "any", 50)
+            results[f"pack_draw_memory[{size}][bytes]"] = tracemalloc.get_traced_memory()[1] - before
+            tracemalloc.stop()
+            del questions
+            results[f"pack_draw[{size}]"] = _measure(
+                lambda _: [pack.draw(Qtype.MULTI_CHOICE, f"category {i % 20}", "medium", 20) for i in range(num_draws)],
+                num_draws * 20, opts.repeat)
+            pack.close()
+    return results
+
+
+@benchmark("stats_store")
+def bench_stats_store(opts):
+    # Sustained stats writes from many games, with the store committing in the background
+    results = {}
+    num_games = 100 if opts.quick else 1000
+    num_players = 10
+    num_questions = 20
+    updates = [(g_id // 10, g_id * num_players + p_id) for g_id in range(num_games) for p_id in range(num_players)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stores = []
+
+        def new_store():
+            stores.append(StatsStore(os.path.join(tmp_dir, f"stats{len(stores)}.db"), _quiet_logger()))
+            return stores[-1]
+
+        def record(stats):
+            # One game's worth of grading for every game, then the final results
+            for q in range(num_questions):
+                for guild_id, user_id in updates:
+                    stats.record_answer(guild_id, user_id, "player", q % 3 != 0, q % 3)
+            for guild_id, user_id in updates:
+                stats.record_game(guild_id, user_id, "player", user_id % num_players == 0, False)
+
+        def sustained(stats):
+            record(stats)
+            stats.close()
+        num_records = len(updates) * (num_questions + 1)
+        # Loop side cost only: buffering, merging and handing batches to the writer thread
+        results[f"stats_record[{num_games} games]"] = _measure(record, num_records, opts.repeat, new_store)
+        # Until every update is committed to disk
+        results[f"stats_sustained[{num_games} games]"] = _measure(sustained, num_records, opts.repeat, new_store)
+        for stats in stores:
+            stats.close()
+    return results
+
+
+@benchmark("replay")
+def bench_replay(opts):
+    # Record a simulated game, then replay it as fast as possible
+    results = {}
+    num_replays = 10 if opts.quick else 50
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for cls in (FFAMultiChoice, FFALives):
+            path = os.path.join(tmp_dir, f"{cls.__name__}.tttr")
+            clock = VirtualClock()
+            game = clock.run(simulate_game(cls, 10, clock, recorder=GameRecorder(path, cls.__name__, 1)))
+            game.get_recorder().close().result()
+            clock.close()
+            results[f"replay[{cls.__name__}]"] = _measure(lambda _: [Replay.replay(path) for _ in range(num_replays)],
+                                                          num_replays, opts.repeat)
+    return results
+
+
+async def _noop_status(status, **kwargs):
+    pass
+
+
+def _refill(questions: QuestionSet):
+    async def initialize():
+        questions.load(OpenTDBProvider.construct_questions(make_payload(questions.get_num_questions()),
+                                                           questions.get_q_type()))
+    return initialize
+
+
+# History and baselines
+UNITS = {"[bytes]": "bytes", "[seconds]": "s", "[per hour]": "/h"}
+LOWER_IS_BETTER = {"bytes", "s"}
+
+
+def _unit(name: str) -> str:
+    # Results are operations per second unless the name says otherwise
+    for suffix, unit in UNITS.items():
+        if name.endswith(suffix):
+            return unit
+    return "ops/s"
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    regressions = []
+    for name, value in results.items():
+        if name not in baseline:
+            continue
+        unit = _unit(name)
+        # Higher is better for throughput, lower is better for memory and durations
+        regressed = value > baseline[name] * (1 + threshold) if unit in LOWER_IS_BETTER else \
+            value < baseline[name] * (1 - threshold)
+        if regressed:
+            regressions.append(f"{name}: {value:,.0f} {unit} vs baseline {baseline[name]:,.0f} {unit} "
+                               f"({value / baseline[name] - 1:+.1%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", help="only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and player counts")
+    parser.add_argument("--history", default=HISTORY_FILE, help="JSON lines file results are appended to")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--save-baseline", help="write this run's results to a baseline file")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="fractional slowdown that counts as a regression")
+    opts = parser.parse_args(argv)
+    opts.repeat = 3 if opts.quick else 5
+    opts.player_counts = PLAYER_COUNTS[:3] if opts.quick else PLAYER_COUNTS
+    # QuestionSet loads the categories relative to the tt_trivia directory
+    os.chdir(TT_DIR)
+    random.seed(0)
+
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if opts.only and not any(only in name for only in opts.only):
+            continue
+        for result, value in func(opts).items():
+            results[result] = value
+            print(f"{result:<50} {value:>16,.1f} {_unit(result)}")
+
+    record = {"timestamp": time.time(), "python": platform.python_version(), "machine": platform.machine(),
+              "results": results}
+    with open(opts.history, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    if opts.save_baseline:
+        with open(opts.save_baseline, "w") as f:
+            json.dump(record, f, indent=2)
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], opts.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,644 @@
+"""
+Unit tests for the game engine's building blocks.
+
+Run from the repository root with "python -m pytest", or from the tt_trivia directory with
+"python -m unittest test.tests".
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+TT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TT_DIR)
+sys.path.insert(0, os.path.join(TT_DIR, "test"))
+
+from Diagnostics import Diagnostics  # noqa: E402
+from GameLogging import StructuredMessage, SampleFilter  # noqa: E402
+from AnswerMatcher import AnswerMatcher, normalize, pattern_masks, bounded_edit_distance  # noqa: E402
+from SeenIndex import SeenIndex  # noqa: E402
+from RateLimit import TokenBucket  # noqa: E402
+from AdmissionControl import AdmissionController, QueueFull  # noqa: E402
+from StatsStore import StatsStore  # noqa: E402
+from GameClock import VirtualClock  # noqa: E402
+from FFAGame import ANSWER_TIME, ANSWER_GRACE  # noqa: E402
+from GameRecorder import GameRecorder, EventType, read_log  # noqa: E402
+from QuestionSet import QuestionSet, QuestionProvider, OpenTDBProvider, Qtype, Question, MCQuestion, ApiError, \
+    NoQuestionsError, RateLimitedError, make_question  # noqa: E402
+from QuestionPack import QuestionPack, INDEX_SUFFIX  # noqa: E402
+from FFAMultiChoice import FFAMultiChoice, button_id, parse_button_id  # noqa: E402
+from FFALives import FFALives  # noqa: E402
+from FFAFreeResponse import FFAFreeResponse  # noqa: E402
+import Replay  # noqa: E402
+import TriviaBot  # noqa: E402
+from benchmarks import compare, simulate_game, make_game, make_question_set, fake_user, fake_message  # noqa: E402
+
+
+class DiagnosticsTest(unittest.TestCase):
+    def test_games_are_tracked_without_snapshots(self):
+        tracemalloc.start()
+        try:
+            game = make_game(FFAMultiChoice, 1)
+            bot = SimpleNamespace(has_game=lambda c_id: False, get_game=None)
+            diagnostics = Diagnostics(bot, logging.getLogger("test"))
+            with mock.patch("tracemalloc.take_snapshot", side_effect=AssertionError("snapshot on the game path")):
+                diagnostics.track_game(game)
+                diagnostics.release_game(game)
+            first, second = asyncio.run(diagnostics.leak_report()), asyncio.run(diagnostics.leak_report())
+        finally:
+            tracemalloc.stop()
+        self.assertIn(f"Game {game.get_channel_id()} (FFAMultiChoice, **retained**)", first)
+        self.assertNotIn("Largest changes", first)
+        self.assertIn("Largest changes since the last report", second)
+
+
+class BenchmarkCompareTest(unittest.TestCase):
+    def test_flags_regressions(self):
+        baseline = {"receive_answer[10]": 1000.0, "pack_index_memory[10000][bytes]": 10.0,
+                    "game_duration[FFALives][early_close][seconds]": 100.0}
+        results = {"receive_answer[10]": 800.0, "pack_index_memory[10000][bytes]": 12.0,
+                   "game_duration[FFALives][early_close][seconds]": 90.0, "new_benchmark": 1.0}
+        regressions = compare(results, baseline, 0.15)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("receive_answer[10]: 800 ops/s"))
+        self.assertTrue(regressions[1].startswith("pack_index_memory[10000][bytes]: 12 bytes"))
+
+    def test_within_threshold(self):
+        self.assertEqual(compare({"end_game[10]": 900.0}, {"end_game[10]": 1000.0}, 0.15), [])
+
+
+def levenshtein(a: str, b: str) -> int:
+    # Textbook dynamic programming version, to check the bit-parallel one against
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ca != cb))
+    return row[-1]
+
+
+class LoggingTest(unittest.TestCase):
+    def test_structured_message(self):
+        logger = logging.getLogger("test.structured")
+        logger.propagate = False
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        logger.debug(StructuredMessage("graded", game=1, player=2, answer="b"))
+        logger.removeHandler(handler)
+        self.assertEqual(records[0].msg.fields, {"game": 1, "player": 2, "answer": "b"})
+        self.assertEqual(records[0].getMessage(), "graded game=1 player=2 answer='b'")
+
+    def test_sample_filter(self):
+        sample = SampleFilter(0.25)
+        record = logging.LogRecord("test", logging.DEBUG, __file__, 0, "answer", None, None)
+        self.assertEqual([sample.filter(record) for _ in range(8)], [True, False, False, False] * 2)
+        record.levelno = logging.WARNING
+        self.assertTrue(all(sample.filter(record) for _ in range(4)))
+
+
+class AnswerMatcherTest(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize("The Beatl&eacute;s!"), "beatles")
+        self.assertEqual(normalize("A"), "a")
+        self.assertEqual(normalize("twenty one"), "21")
+        self.assertEqual(normalize("Twenty-One Pilots"), "21 pilots")
+        self.assertEqual(normalize("one hundred and five"), "105")
+        self.assertEqual(normalize("one million two thousand three hundred"), "1002300")
+        self.assertEqual(normalize("one two"), "1 2")
+        self.assertEqual(normalize("rock and roll"), "rock and roll")
+
+    def test_bounded_edit_distance_matches_levenshtein(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            pattern = "".join(rng.choice("abcd ") for _ in range(rng.randint(0, 12)))
+            text = "".join(rng.choice("abcd ") for _ in range(rng.randint(0, 12)))
+            max_edits = rng.randint(0, 4)
+            expected = levenshtein(pattern, text)
+            result = bounded_edit_distance(pattern_masks(pattern), len(pattern), text, max_edits)
+            self.assertEqual(result, expected if expected <= max_edits else None, (pattern, text, max_edits))
+
+    def test_matches(self):
+        matcher = AnswerMatcher("The Rolling Stones")
+        self.assertTrue(matcher.matches("rolling stones"))
+        self.assertTrue(matcher.matches("Roling Stones"))
+        self.assertFalse(matcher.matches("the beatles"))
+        self.assertFalse(matcher.matches(""))
+        # Numbers have to be exact
+        self.assertTrue(AnswerMatcher("21").matches("twenty-one"))
+        self.assertFalse(AnswerMatcher("21").matches("22"))
+        # Symbols that matter aren't normalized away
+        self.assertFalse(AnswerMatcher("C++").matches("C#"))
+        self.assertFalse(AnswerMatcher("C#").matches("C++"))
+        self.assertTrue(AnswerMatcher("C++").matches(" c++"))
+        # Nor are answers with nothing left after normalizing
+        for answer, guess in (("+", "+"), ("&pi;", "π"), ("Ω", "ω")):
+            self.assertEqual(normalize(answer), "")
+            self.assertTrue(AnswerMatcher(answer).matches(guess), answer)
+        self.assertFalse(AnswerMatcher("Ω").matches(""))
+
+
+class SeenIndexTest(unittest.TestCase):
+    def test_add_and_contains(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "guild.seen")
+            seen = SeenIndex(path)
+            self.assertNotIn("What is 2 + 2?", seen)
+            seen.add("What is 2 + 2?")
+            seen.add("What is 2 + 2?")
+            self.assertIn("What is 2 + 2?", seen)
+            self.assertEqual(len(seen), 1)
+            seen.close()
+            # The filter survives a restart
+            seen = SeenIndex(path)
+            self.assertIn("What is 2 + 2?", seen)
+            self.assertNotIn("What is 3 + 3?", seen)
+            seen.close()
+
+    def test_starts_over_when_full(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            seen = SeenIndex(os.path.join(tmp_dir, "guild.seen"), num_bits=1024, num_hashes=4)
+            for i in range(1000):
+                seen.add(f"question {i}")
+            self.assertLess(len(seen), 1000)
+            self.assertIn("question 999", seen)
+            seen.close()
+
+
+class FakeProvider(QuestionProvider):
+    """Provider with a fixed pool of questions, which records the amount of every fetch."""
+    default_category = "any"
+
+    def __init__(self, num_questions: int, max_amount: int | None = None):
+        self.questions = [make_question(Qtype.MULTI_CHOICE, "any", "easy", f"Question {i}?", "A", ["B", "C", "D"])
+                          for i in range(num_questions)]
+        # Fetches for more than this fail, like an opentdb session running low on questions
+        self.max_amount = max_amount
+        self.fetches = []
+
+    def __contains__(self, category: str) -> bool:
+        return category == "any"
+
+    def names(self) -> list[str]:
+        return ["any"]
+
+    def cap(self, q_type: Qtype, category: str, difficulty: str, num: int) -> int:
+        return min(num, len(self.questions))
+
+    async def fetch(self, q_type: Qtype, category: str, difficulty: str, amount: int) -> list[Question]:
+        self.fetches.append(amount)
+        if self.max_amount is not None and amount > self.max_amount:
+            raise ApiError(f"Only {self.max_amount} questions left")
+        return self.questions[:amount]
+
+
+class UnseenQuestionsTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.seen = SeenIndex(os.path.join(self._tmp_dir.name, "guild.seen"))
+
+    def tearDown(self):
+        self.seen.close()
+        self._tmp_dir.cleanup()
+
+    def test_one_request_settles_for_repeats(self):
+        provider = FakeProvider(50)
+        for question in provider.questions[:5]:
+            self.seen.add(question.question)
+        self.seen.record_fetch(10, 5)
+        amount = self.seen.fetch_size(10)
+        questions = QuestionSet(Qtype.MULTI_CHOICE, provider=provider, seen=self.seen, num=10)
+        asyncio.run(questions.initialize())
+        self.assertEqual(provider.fetches, [amount])
+        # The fresh questions come first, the repeats fill in the rest
+        self.assertEqual([q.question for q in questions.get_questions()],
+                         [f"Question {i}?" for i in itertools.chain(range(5, amount), range(15 - amount))])
+        self.assertGreater(self.seen.get_repeat_rate(), 0.15)
+
+    def test_falls_back_to_exact_amount(self):
+        self.seen.record_fetch(10, 5)
+        amount = self.seen.fetch_size(10)
+        provider = FakeProvider(50, max_amount=10)
+        questions = QuestionSet(Qtype.MULTI_CHOICE, provider=provider, seen=self.seen, num=10)
+        asyncio.run(questions.initialize())
+        self.assertEqual(provider.fetches, [amount, 10])
+        self.assertEqual(len(questions.get_questions()), 10)
+
+    def test_rate_limited_request_is_retried(self):
+        provider = OpenTDBProvider()
+        with mock.patch("QuestionSet.REQUEST_INTERVAL", 0), \
+                mock.patch.object(OpenTDBProvider, "_request_url", return_value="url"), \
+                mock.patch.object(provider, "_fetch_questions", side_effect=[RateLimitedError("code 5"), ["question"]]):
+            self.assertEqual(asyncio.run(provider.fetch(Qtype.MULTI_CHOICE, "any", "any", 1)), ["question"])
+            self.assertEqual(provider._fetch_questions.call_count, 2)
+
+    def test_requests_are_spaced_out(self):
+        async def request_times():
+            times = []
+            for _ in range(3):
+                await OpenTDBProvider._wait_turn()
+                times.append(time.monotonic())
+            return times
+        with mock.patch("QuestionSet.REQUEST_INTERVAL", 0.05), mock.patch.object(OpenTDBProvider, "_next_request", 0.0):
+            times = asyncio.run(request_times())
+        self.assertGreaterEqual(times[1] - times[0], 0.04)
+        self.assertGreaterEqual(times[2] - times[1], 0.04)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_take_and_refill(self):
+        bucket = TokenBucket(rate=1, capacity=2, now=0)
+        self.assertTrue(bucket.try_take(0))
+        self.assertTrue(bucket.try_take(0))
+        self.assertFalse(bucket.try_take(0))
+        self.assertAlmostEqual(bucket.time_until(0), 1)
+        self.assertTrue(bucket.try_take(1))
+        self.assertFalse(bucket.is_full(1))
+        self.assertTrue(bucket.is_full(10))
+
+    def test_rejects_bad_parameters(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, capacity=1, now=0)
+
+
+class AdmissionControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+
+    def tearDown(self):
+        self.clock.close()
+
+    def test_concurrency_limit_and_release(self):
+        async def run():
+            admission = AdmissionController(self.clock, max_games=2, starts_per_second=100, burst=10, max_queued=1)
+            first, second, third = (admission.request(key) for key in "abc")
+            self.assertTrue(first.done() and second.done())
+            self.assertFalse(third.done())
+            self.assertEqual(admission.position("c"), 1)
+            with self.assertRaises(QueueFull):
+                admission.request("d")
+            admission.release("a")
+            self.assertTrue(third.done())
+            self.assertEqual(admission.get_stats()["running"], 2)
+        self.clock.run(run())
+
+    def test_start_rate(self):
+        async def run():
+            admission = AdmissionController(self.clock, max_games=10, starts_per_second=1, burst=1)
+            first, second = admission.request("a"), admission.request("b")
+            self.assertTrue(first.done())
+            self.assertFalse(second.done())
+            await second
+            self.assertAlmostEqual(self.clock.now(), 1, places=3)
+        self.clock.run(run())
+
+    def test_released_while_queued(self):
+        async def run():
+            admission = AdmissionController(self.clock, max_games=1)
+            admission.request("a")
+            queued = admission.request("b")
+            admission.release("b")
+            self.assertTrue(queued.cancelled())
+            self.assertEqual(admission.position("b"), 0)
+        self.clock.run(run())
+
+
+class GameStartTest(unittest.TestCase):
+    def test_failed_start_gives_back_its_slot(self):
+        TriviaBot.logger = logging.getLogger("test")
+
+        async def run():
+            bot = TriviaBot.TriviaBot.__new__(TriviaBot.TriviaBot)
+            bot._games, bot._guild_games, bot._diagnostics = {}, {}, None
+            bot._admission = AdmissionController(max_games=1)
+            # Every fetch fails, like opentdb being down
+            game = FFAMultiChoice({"provider": FakeProvider(10, max_amount=0), "num": 5}, 1, bot,
+                                  logging.getLogger("test"), channel_id=2)
+            bot._games[2], bot._guild_games[1] = game, {2}
+            message = SimpleNamespace(reply=mock.AsyncMock())
+            self.assertTrue(await bot._admit_game(message, 2))
+            await bot._start_game(message, 2)
+            self.assertEqual((bot._games, bot._guild_games), ({}, {}))
+            self.assertEqual(bot._admission.get_stats()["running"], 0)
+            message.reply.assert_awaited_once()
+        asyncio.run(run())
+
+
+class AnswerThrottleTest(unittest.TestCase):
+    def test_only_valid_answers_are_charged(self):
+        clock = VirtualClock()
+        game = make_game(FFAMultiChoice, 2, clock=clock)
+        game._current_question = next(iter(game._questions))
+        player = fake_user(0)
+        # Chatting during a question doesn't use up answers
+        for i in range(10):
+            game.receive_answer(fake_message(f"no idea {i}", player))
+        for answer in "ababa":
+            game.receive_answer(fake_message(answer, player))
+        self.assertEqual(game._players[0].answer, "a")
+        game.receive_answer(fake_message("b", player))
+        self.assertEqual(game._players[0].answer, "a")
+        game.receive_answer(fake_message("b", fake_user(1)))
+        game.receive_answer(fake_message("b", fake_user(1)))
+        game.receive_answer(fake_message("c" * 201, fake_user(1)))
+        game.receive_answer(fake_message("c", fake_user(2)))
+        self.assertEqual(game._players[1].answer, "b")
+        self.assertEqual(game.get_dropped_answers(), {"non_player": 1, "duplicate": 1, "oversized": 1, "throttled": 1})
+        clock.close()
+
+
+class StatsStoreTest(unittest.TestCase):
+    def test_write_behind_round_trip(self):
+        logger = logging.getLogger("test")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stats.db")
+            store = StatsStore(path, logger, flush_rows=2)
+            for correct, streak in ((True, 1), (True, 2), (False, 0)):
+                store.record_answer(1, 10, "alice", correct, streak)
+            store.record_answer(1, 20, "bob", True, 1)
+            # Third player forces a size based flush of the first two
+            store.record_answer(2, 30, "carol", True, 1)
+            store.record_game(1, 10, "alice", won=True, perfect=False)
+            top = asyncio.run(store.top(1))
+            self.assertEqual(top, [("alice", 2, 1, 1, 2), ("bob", 1, 0, 0, 1)])
+            store.close()
+            store.close()
+            # Updates accumulate across stores, and across guilds in the global table
+            store = StatsStore(path, logger)
+            store.record_answer(2, 10, "alice", True, 5)
+            self.assertEqual(asyncio.run(store.top())[0], ("alice", 3, 1, 1, 5))
+            store.close()
+
+
+class RecordingTest(unittest.TestCase):
+    def test_events_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "game.tttr")
+            recorder = GameRecorder(path, "FFAMultiChoice", 42)
+            recorder.start(100.0)
+            recorder.join(101.0, 7, "alice")
+            recorder.answer(102.5, 7, "b")
+            recorder.button(103.0, 7, "c")
+            recorder.end(104.0)
+            recorder.close().result()
+            game_mode, guild_id, events = read_log(path)
+            self.assertEqual((game_mode, guild_id), ("FFAMultiChoice", 42))
+            self.assertEqual([(e.type, e.time, e.user_id, e.payload) for e in events], [
+                (EventType.JOIN, 1.0, 7, "alice"), (EventType.ANSWER, 2.5, 7, "b"), (EventType.BUTTON, 3.0, 7, "c"),
+                (EventType.END, 4.0, 0, "")])
+
+    def test_replay_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for cls, speed_scoring in itertools.product((FFAMultiChoice, FFALives, FFAFreeResponse), (False, True)):
+                path = os.path.join(tmp_dir, f"{cls.__name__}-{speed_scoring}.tttr")
+                clock = VirtualClock()
+
+                async def play():
+                    return await simulate_game(cls, 5, clock, recorder=GameRecorder(path, cls.__name__, 1),
+                                               speed_scoring=speed_scoring)
+                game = clock.run(play())
+                game.get_recorder().close().result()
+                clock.close()
+                replayed = Replay.replay(path)
+                self.assertEqual(Replay.game_digest(replayed), Replay.game_digest(game), cls.__name__)
+                self.assertEqual(replayed.get_latency_report(), game.get_latency_report(), cls.__name__)
+
+    def test_replay_ignores_presses_outside_answer_windows(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "lobby.tttr")
+            recorder = GameRecorder(path, "FFAMultiChoice", 1)
+            recorder.start(0.0)
+            recorder.questions(0.0, Qtype.MULTI_CHOICE, make_question_set(5).get_questions())
+            # A press while the lobby is open, which TriviaBot would never have handed to the game
+            recorder.button(1.0, 7, "a")
+            recorder.close().result()
+            self.assertEqual(Replay.replay(path).get_dropped_answers()["non_player"], 0)
+
+    def test_replay_without_questions(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "lobby.tttr")
+            recorder = GameRecorder(path, "FFAMultiChoice", 1)
+            recorder.start(0.0)
+            recorder.close().result()
+            with self.assertRaises(ValueError):
+                Replay.replay(path)
+
+
+class ParseStartMessageTest(unittest.TestCase):
+    def setUp(self):
+        # Only the parsing state is needed, not a connected client
+        TriviaBot.logger = logging.getLogger("test")
+        self.bot = TriviaBot.TriviaBot.__new__(TriviaBot.TriviaBot)
+        self.bot._game_code_to_q_type = {"mc": Qtype.MULTI_CHOICE, "lives": Qtype.MULTI_CHOICE,
+                                         "tf": Qtype.TRUE_FALSE, "free": Qtype.FREE_RESPONSE}
+        self.bot._categories = TriviaBot.CATEGORIES
+
+    def test_defaults(self):
+        self.assertEqual(self.bot._parse_start_message("start mc"), ("mc", Qtype.MULTI_CHOICE, {}, False))
+
+    def test_all_options(self):
+        self.assertEqual(self.bot._parse_start_message("start free speed 15 hard cat general knowledge"),
+                         ("free", Qtype.FREE_RESPONSE,
+                          {"num": 15, "difficulty": "hard", "category": "general knowledge"}, True))
+        self.assertEqual(self.bot._parse_start_message("start lives speed"), ("lives", Qtype.MULTI_CHOICE, {}, True))
+
+    def test_invalid(self):
+        for msg in ("start", "start chess", "start mc 100", "start mc speedy", "start mc cat not a category"):
+            self.assertIsNone(self.bot._parse_start_message(msg), msg)
+
+
+class WindowCheckedLives(FFALives):
+    # Counts answer windows that open with answers left over from the previous question
+    stale_windows = 0
+
+    async def _wait_answers(self):
+        if self._all_answered.is_set() or self._answered_count or self._last_answers or \
+                any(p.answer is not None or p.answer_time is not None for p in self._players.values()):
+            self.stale_windows += 1
+        await super()._wait_answers()
+
+
+class AnswerLatencyTest(unittest.TestCase):
+    def test_changed_answers_sample_reaction_time_once(self):
+        clock = VirtualClock()
+        game = make_game(FFAMultiChoice, 2, clock=clock)
+        game._current_question = next(iter(game._questions))
+
+        async def answer():
+            game._mark_question_delivered(None)
+            for answer in "aba":
+                await clock.sleep(2)
+                game.receive_answer(fake_message(answer, fake_user(0)))
+            game.receive_answer(fake_message("c", fake_user(1)))
+        clock.run(answer())
+        clock.close()
+        # Scoring uses the final answer's time, the histograms only the first
+        self.assertAlmostEqual(game._players[0].answer_time, 6)
+        self.assertEqual(game._player_latency[0].count, 1)
+        self.assertAlmostEqual(game._player_latency[0].total, 2)
+        self.assertEqual(game._question_latency.count, 2)
+
+
+class EarlyCloseTest(unittest.TestCase):
+    def play(self, cls, early_close: bool, reaction_time: tuple[float, float]):
+        clock = VirtualClock()
+
+        async def play():
+            start = clock.now()
+            game = await simulate_game(cls, 4, clock, early_close=early_close, reaction_time=reaction_time)
+            return game, clock.now() - start
+        try:
+            return clock.run(play())
+        finally:
+            clock.close()
+
+    def test_closes_once_everyone_answers(self):
+        _, full_window = self.play(FFAMultiChoice, False, (0.5, 2))
+        _, early_close = self.play(FFAMultiChoice, True, (0.5, 2))
+        # Ten questions, each closing within a couple of seconds of opening instead of after the full window
+        self.assertLess(early_close, full_window - 10 * (ANSWER_TIME - 2 - ANSWER_GRACE))
+
+    def test_lives_eliminations_start_clean_questions(self):
+        for _ in range(5):
+            game, _ = self.play(WindowCheckedLives, True, (5, 14))
+            self.assertEqual(game.stale_windows, 0)
+            self.assertEqual(len(game._players), 1)
+
+
+class QuestionPackTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp_dir.name, "pack.jsonl")
+        question = {"category": "Cats", "difficulty": "easy", "question": "Q?", "correct_answer": "A",
+                    "incorrect_answers": ["B", "C", "D"]}
+        rows = [dict(question, question=f"Cat question {i}") for i in range(10)]
+        rows += [dict(question, category="Dogs", difficulty="hard", question=f"Dog question {i}") for i in range(5)]
+        rows.append(dict(question, type="boolean", correct_answer="True", incorrect_answers=["False"]))
+        # Malformed: missing fields, wrong number of choices, unknown type, not an object
+        rows += [{"category": "Cats", "difficulty": "easy"}, dict(question, incorrect_answers=["B"] * 5),
+                 dict(question, incorrect_answers=[]), dict(question, type="essay"), [1, 2]]
+        with open(self.path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.write("not json\n")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_index(self):
+        pack = QuestionPack(self.path)
+        self.assertEqual(len(pack), 16)
+        self.assertEqual(pack.names(), ["any", "cats", "dogs"])
+        self.assertIn("dogs", pack)
+        self.assertEqual(pack.available(Qtype.MULTI_CHOICE, "cats", "any"), 10)
+        self.assertEqual(pack.available(Qtype.MULTI_CHOICE, "any", "hard"), 5)
+        self.assertEqual(pack.available(Qtype.TRUE_FALSE, "any", "any"), 1)
+        pack.close()
+        # The saved index is used on the next load
+        self.assertTrue(os.path.exists(self.path + INDEX_SUFFIX))
+        pack = QuestionPack(self.path)
+        self.assertEqual(len(pack), 16)
+        pack.close()
+
+    def test_draw(self):
+        pack = QuestionPack(self.path)
+        questions = pack.draw(Qtype.MULTI_CHOICE, "dogs", "any", 5)
+        self.assertEqual(sorted(q.question for q in questions), [f"Dog question {i}" for i in range(5)])
+        for question in questions:
+            self.assertIsInstance(question, MCQuestion)
+            self.assertEqual(len(question.choices), 4)
+            self.assertEqual(question.choices[question.answer_index], "A")
+        self.assertIs(pack.draw(Qtype.TRUE_FALSE, "cats", "easy", 1)[0].answer, True)
+        with self.assertRaises(ApiError):
+            pack.draw(Qtype.MULTI_CHOICE, "dogs", "any", 6)
+        pack.close()
+
+    def test_question_set(self):
+        pack = QuestionPack(self.path)
+        questions = QuestionSet(Qtype.MULTI_CHOICE, provider=pack, num=50)
+        self.assertEqual(questions.get_num_questions(), 15)
+        asyncio.run(questions.initialize())
+        self.assertEqual(len(list(questions)), 15)
+        with self.assertRaises(NoQuestionsError):
+            QuestionSet(Qtype.MULTI_CHOICE, provider=pack, category="cats", difficulty="hard")
+        pack.close()
+
+    def test_csv(self):
+        path = os.path.join(self._tmp_dir.name, "pack.csv")
+        with open(path, "w", newline="") as f:
+            f.write("Category,Difficulty,Question,Correct_Answer,Incorrect_Answer_1,Incorrect_Answer_2,"
+                    "Incorrect_Answer_3\r\n")
+            f.write('Birds,medium,"Which bird, if any?",Owl,Crow,Duck,Hen\r\n')
+            f.write("Birds,medium,Too few choices?,Owl,Crow,,\r\n")
+        pack = QuestionPack(path)
+        self.assertEqual(len(pack), 1)
+        question = pack.draw(Qtype.MULTI_CHOICE, "birds", "medium", 1)[0]
+        self.assertEqual(question.question, "Which bird, if any?")
+        self.assertEqual(sorted(question.choices), ["Crow", "Duck", "Hen", "Owl"])
+        pack.close()
+
+
+class PackStartCommandTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self._tmp_dir.name, "pack.jsonl")
+        with open(path, "w") as f:
+            for i, category in enumerate(("90s Music", "Sci-Fi") * 5):
+                f.write(json.dumps({"category": category, "difficulty": "easy", "question": f"Question {i}?",
+                                    "correct_answer": "A", "incorrect_answers": ["B", "C", "D"]}) + "\n")
+        self.pack = QuestionPack(path)
+        TriviaBot.logger = logging.getLogger("test")
+        self.bot = TriviaBot.TriviaBot.__new__(TriviaBot.TriviaBot)
+        self.bot._game_code_to_q_type = {"mc": Qtype.MULTI_CHOICE, "lives": Qtype.MULTI_CHOICE,
+                                         "tf": Qtype.TRUE_FALSE, "free": Qtype.FREE_RESPONSE}
+        self.bot._categories = self.bot._question_pack = self.pack
+        self.bot._games, self.bot._guild_games, self.bot._max_guild_games = {}, {}, 5
+        self.bot._stats = self.bot._record_dir = self.bot._diagnostics = None
+        self.bot._get_seen_index = lambda guild_id: None
+        self.bot.say = mock.AsyncMock()
+
+    def tearDown(self):
+        self.pack.close()
+        self._tmp_dir.cleanup()
+
+    def test_pack_category_names(self):
+        self.assertEqual(self.bot._parse_start_message("start mc 5 cat 90s music"),
+                         ("mc", Qtype.MULTI_CHOICE, {"num": 5, "category": "90s music"}, False))
+        self.assertEqual(self.bot._parse_start_message("start mc easy cat sci-fi"),
+                         ("mc", Qtype.MULTI_CHOICE, {"difficulty": "easy", "category": "sci-fi"}, False))
+        self.assertIsNone(self.bot._parse_start_message("start mc cat 80s music"))
+
+    def test_no_questions_is_explained_once(self):
+        message = SimpleNamespace(content="ttt start mc hard cat sci-fi", author=SimpleNamespace(id=5),
+                                  guild=SimpleNamespace(id=1), channel=SimpleNamespace(id=2), reply=mock.AsyncMock())
+        with mock.patch.object(TriviaBot.TriviaBot, "user", SimpleNamespace(id=0)):
+            asyncio.run(self.bot.on_message(message))
+        self.bot.say.assert_awaited_once_with(2, "There are no hard questions in the sci-fi category, try another "
+                                                 "category or difficulty.")
+        message.reply.assert_not_awaited()
+        self.assertEqual(self.bot._games, {})
+
+
+class ButtonIdTest(unittest.TestCase):
+    def test_round_trip(self):
+        for choice in "abcd":
+            self.assertEqual(parse_button_id(button_id(1234567890123, choice)), (1234567890123, choice))
+
+    def test_rejects_other_ids(self):
+        for custom_id in ("", "ttt", "ttt:1:e", "ttt:x:a", "ttt:-1:a", "other:1:a", "ttt:1:a:extra"):
+            self.assertIsNone(parse_button_id(custom_id), custom_id)
+
+
+if __name__ == "__main__":
+    unittest.main()